@@ -6,10 +6,6 @@ from app.models import (
     Assignment, Submission, DoubtRoom, Performance
 )
 
-# Create application
-app = create_app(os.getenv('FLASK_ENV', 'development'))
-
-@app.shell_context_processor
 def make_shell_context():
     """Create application context for Flask shell"""
     return {
@@ -30,5 +26,13 @@ def make_shell_context():
         'Performance': Performance
     }
 
+# Pool processes started with 'spawn' (PDF extraction, OCR) re-import this
+# script as __mp_main__; only a real import builds the app and starts its
+# background schedulers
+if __name__ != '__mp_main__':
+    # Create application
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    app.shell_context_processor(make_shell_context)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
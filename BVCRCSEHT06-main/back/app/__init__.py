@@ -19,15 +19,53 @@ def create_app(config_name='development'):
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    CORS(app, origins=app.config['CORS_ORIGINS'])
+    CORS(app, origins=app.config['CORS_ORIGINS'], expose_headers=['ETag', 'X-Next-Cursor', 'X-Total-Count'])
     
     # Setup logging
     setup_logging(app)
     
+    # Conditional GET (ETag / If-None-Match)
+    from app.middleware import init_etag
+    init_etag(app)
+    
+    # Configure in-process caches
+    from app.services.quiz_cache import quiz_cache
+    from app.services.cohort import cohort_cache
+    from app.services.response_cache import response_cache
+    from app.services.ai_cache import ai_cache
+    quiz_cache.init_app(app)
+    cohort_cache.init_app(app)
+    response_cache.init_app(app)
+    ai_cache.init_app(app)
+    
+    # Exam-start admission queue
+    from app.services.admission import admission
+    admission.init_app(app)
+    
+    # Background AI grading of descriptive/coding answers
+    from app.services.ai_grading import ai_grading_queue
+    ai_grading_queue.init_app(app)
+    
+    # Section leaderboards
+    from app.services.leaderboard import leaderboards
+    leaderboards.init_app(app)
+    
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['LOG_FILE'].rsplit('/', 1)[0], exist_ok=True)
     
+    # Content-addressed upload store
+    from app.services.blob_store import blob_store
+    blob_store.init_app(app)
+    
+    # PDF page indexes stored next to the blobs
+    from app.services.pdf_index import pdf_index
+    pdf_index.init_app(app)
+    
+    # Background upload analysis jobs
+    from app.services.analysis_jobs import analysis_jobs
+    analysis_jobs.init_app(app)
+    
     # Register blueprints
     from app.blueprints.auth import auth_bp
     from app.blueprints.upload import upload_bp
@@ -43,6 +81,10 @@ def create_app(config_name='development'):
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     
+    # Maintenance commands (flask upgrade-schema, prune-blobs, ...)
+    from app.cli import register_commands
+    register_commands(app)
+    
     # Database initialization
     with app.app_context():
         db.create_all()
@@ -2,6 +2,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
 from app.models import User, Institution, Department, Teacher, Student, Section, Year
+from app.services.quiz_cache import quiz_cache
+from app.services.cohort import cohort_cache
+from app.services.response_cache import response_cache
+from app.services.ai_cache import ai_cache
+from app.services.analysis_jobs import analysis_jobs
 from app.utils.decorators import require_role
 
 admin_bp = Blueprint('admin', __name__)
@@ -99,3 +104,22 @@ def get_system_stats():
         'total_teachers': total_teachers,
         'total_institutions': total_institutions
     }), 200
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+@require_role(['admin'])
+def get_cache_stats():
+    """Get in-process cache hit/miss counters for this worker"""
+    return jsonify({
+        'quiz_cache': quiz_cache.stats(),
+        'cohort_cache': cohort_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'ai_cache': ai_cache.stats()
+    }), 200
+
+@admin_bp.route('/analysis-jobs', methods=['GET'])
+@jwt_required()
+@require_role(['admin'])
+def get_analysis_job_stats():
+    """Get upload analysis job counts by status and this worker's pool usage"""
+    return jsonify(analysis_jobs.stats()), 200
@@ -1,15 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db
-from app.models import Student, Teacher, Performance, QuizAttempt, Submission, Assignment
-from app.utils.decorators import require_role
-from sqlalchemy import func
+from app.models import User, Student, Teacher
+from app.services import item_analysis, class_analytics, concepts, progress, export, cohort
+from app.services.cohort import cohort_cache
+from app.services.response_cache import response_cache
+from app.services.performance import get_overall as get_overall_performance
+from app.services.leaderboard import leaderboards
+from app.utils.decorators import require_role, require_scope_access
+from datetime import datetime, timedelta
 
 analytics_bp = Blueprint('analytics', __name__)
 
 @analytics_bp.route('/student/dashboard', methods=['GET'])
 @jwt_required()
 @require_role(['student'])
+@response_cache.cached(lambda: [('user', get_jwt_identity())])
 def student_dashboard():
     """Get student analytics dashboard"""
     user_id = get_jwt_identity()
@@ -18,32 +23,16 @@ def student_dashboard():
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     
-    # Get performance data
-    performance = Performance.query.filter_by(student_id=student.id).first()
-    
-    # Calculate quiz statistics
-    quiz_attempts = QuizAttempt.query.filter_by(
-        student_id=student.id,
-        status='completed'
-    ).all()
-    
-    avg_quiz_score = sum(a.percentage for a in quiz_attempts) / len(quiz_attempts) if quiz_attempts else 0
-    
-    # Calculate assignment statistics
-    submissions = Submission.query.filter_by(
-        student_id=student.id,
-        status='graded'
-    ).all()
-    
-    avg_assignment_score = sum(s.grade for s in submissions) / len(submissions) if submissions else 0
+    # Aggregates are kept current as quizzes complete and submissions are graded
+    performance = get_overall_performance(student.id)
     
     return jsonify({
         'student_name': student.user.first_name + ' ' + student.user.last_name,
-        'quiz_average': avg_quiz_score,
-        'assignment_average': avg_assignment_score,
-        'overall_score': (avg_quiz_score + avg_assignment_score) / 2,
-        'total_quizzes_taken': len(quiz_attempts),
-        'total_assignments_submitted': len(submissions),
+        'quiz_average': performance.quiz_average if performance else 0,
+        'assignment_average': performance.assignment_average if performance else 0,
+        'overall_score': performance.overall_score if performance else 0,
+        'total_quizzes_taken': performance.quiz_count if performance else 0,
+        'total_assignments_submitted': performance.assignment_count if performance else 0,
         'weak_concepts': performance.weak_concepts if performance else [],
         'strong_concepts': performance.strong_concepts if performance else [],
         'improvement_suggestions': performance.improvement_suggestions if performance else [],
@@ -53,6 +42,7 @@ def student_dashboard():
 @analytics_bp.route('/teacher/class-analytics/<section_id>', methods=['GET'])
 @jwt_required()
 @require_role(['teacher'])
+@response_cache.cached(lambda section_id: [('section', section_id)])
 def teacher_class_analytics(section_id):
     """Get class analytics for teacher"""
     from app.models import Section
@@ -61,47 +51,96 @@ def teacher_class_analytics(section_id):
     if not section:
         return jsonify({'error': 'Section not found'}), 404
     
-    students = Student.query.filter_by(section_id=section_id).all()
-    
-    analytics_data = []
-    for student in students:
-        quiz_attempts = QuizAttempt.query.filter_by(student_id=student.id).all()
-        submissions = Submission.query.filter_by(student_id=student.id).all()
-        
-        avg_quiz = sum(a.percentage for a in quiz_attempts) / len(quiz_attempts) if quiz_attempts else 0
-        avg_assignment = sum(s.grade for s in submissions if s.grade) / len([s for s in submissions if s.grade]) if submissions else 0
-        
-        analytics_data.append({
-            'student_name': student.user.first_name + ' ' + student.user.last_name,
-            'roll_number': student.roll_number,
-            'avg_quiz_score': avg_quiz,
-            'avg_assignment_score': avg_assignment,
-            'overall_score': (avg_quiz + avg_assignment) / 2,
-            'quizzes_taken': len(quiz_attempts),
-            'assignments_submitted': len(submissions)
-        })
+    analytics_data = class_analytics.student_averages('section', section_id)
+    summary = class_analytics.summarize(analytics_data)
     
     return jsonify({
         'section': section.name,
-        'total_students': len(students),
-        'class_average': sum(a['overall_score'] for a in analytics_data) / len(analytics_data) if analytics_data else 0,
+        'total_students': summary['total_students'],
+        'class_average': summary['class_average'],
+        'students': analytics_data
+    }), 200
+
+@analytics_bp.route('/teacher/<scope>-analytics/<scope_id>', methods=['GET'])
+@jwt_required()
+@require_role(['teacher', 'admin'])
+@require_scope_access
+@response_cache.cached(lambda scope, scope_id: [(scope, scope_id)])
+def teacher_hierarchy_analytics(scope, scope_id):
+    """Get year- or department-wide analytics with a per-section breakdown"""
+    from app.models import Year, Department
+    
+    models = {'year': Year, 'department': Department}
+    if scope not in models:
+        return jsonify({'error': 'Scope must be year or department'}), 404
+    
+    entity = models[scope].query.get(scope_id)
+    if not entity:
+        return jsonify({'error': f'{scope.capitalize()} not found'}), 404
+    
+    analytics_data = class_analytics.student_averages(scope, scope_id)
+    summary = class_analytics.summarize(analytics_data)
+    
+    return jsonify({
+        'scope': scope,
+        'scope_id': scope_id,
+        'name': entity.name if scope == 'department' else f'Year {entity.year_number}',
+        'total_students': summary['total_students'],
+        'average': summary['class_average'],
+        'sections': summary['sections'],
         'students': analytics_data
     }), 200
 
+@analytics_bp.route('/cohort/<scope>/<scope_id>', methods=['GET'])
+@jwt_required()
+@require_role(['teacher', 'admin'])
+@require_scope_access
+def cohort_distribution(scope, scope_id):
+    """Get the score distribution of an institution, department, year or section"""
+    if scope not in cohort.SCOPES:
+        return jsonify({'error': f'Scope must be one of: {", ".join(cohort.SCOPES)}'}), 404
+    
+    quiz_id = request.args.get('quiz_id')
+    result = cohort_cache.get(scope, scope_id, quiz_id)
+    
+    return jsonify({
+        'scope': scope,
+        'scope_id': scope_id,
+        'quiz_id': quiz_id,
+        **result
+    }), 200
+
 @analytics_bp.route('/parent/child-progress/<student_id>', methods=['GET'])
 @jwt_required()
 @require_role(['parent'])
+@response_cache.cached(lambda student_id: [('student', student_id)])
 def parent_child_progress(student_id):
-    """Get child progress for parent"""
+    """Get child progress for parent.
+
+    Trends cover the last `limit` attempts by default, or daily buckets
+    when `days` or a `from`/`to` date range is given.
+    """
     student = Student.query.get(student_id)
     
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     
-    performance = Performance.query.filter_by(student_id=student_id).first()
+    config = current_app.config
+    try:
+        limit = max(1, min(int(request.args.get('limit', config['PROGRESS_TREND_LIMIT'])),
+                           config['PROGRESS_TREND_MAX_LIMIT']))
+        start, end = _trend_range(request.args, config['PROGRESS_TREND_MAX_DAYS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    performance = get_overall_performance(student_id)
     
-    quiz_attempts = QuizAttempt.query.filter_by(student_id=student_id).all()
-    submissions = Submission.query.filter_by(student_id=student_id).all()
+    if start:
+        window = {'type': 'daily', 'from': start.date().isoformat(), 'to': (end - timedelta(days=1)).date().isoformat()}
+        quiz_score_trend = progress.daily_quiz_scores(student_id, start, end)
+    else:
+        window = {'type': 'recent', 'limit': limit}
+        quiz_score_trend = progress.recent_quiz_scores(student_id, limit)
     
     return jsonify({
         'student_name': student.user.first_name + ' ' + student.user.last_name,
@@ -110,60 +149,141 @@ def parent_child_progress(student_id):
         'strengths': performance.strong_concepts if performance else [],
         'weaknesses': performance.weak_concepts if performance else [],
         'suggestions': performance.improvement_suggestions if performance else [],
-        'quiz_score_trend': [{'quiz_num': i+1, 'score': a.percentage} for i, a in enumerate(quiz_attempts[-5:])],
-        'recent_assignments': [{
-            'title': s.assignment.title,
-            'grade': s.grade,
-            'feedback': s.ai_feedback
-        } for s in submissions[-5:]]
+        'window': window,
+        'quiz_score_trend': quiz_score_trend,
+        'recent_assignments': progress.recent_submissions(student_id, limit, start, end)
     }), 200
 
+def _trend_range(args, max_days):
+    """Parse ?days=N or ?from=YYYY-MM-DD&to=YYYY-MM-DD into a [start, end) datetime range"""
+    if args.get('from') or args.get('to'):
+        try:
+            end = datetime.fromisoformat(args['to']) if args.get('to') else datetime.utcnow()
+            end = datetime.combine(end.date(), datetime.min.time()) + timedelta(days=1)
+            start = datetime.fromisoformat(args['from']) if args.get('from') else end - timedelta(days=max_days)
+            start = datetime.combine(start.date(), datetime.min.time())
+        except ValueError:
+            raise ValueError('from and to must be dates like 2024-01-31')
+    elif args.get('days'):
+        try:
+            days = int(args['days'])
+        except ValueError:
+            raise ValueError('days must be an integer')
+        end = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=1)
+        start = end - timedelta(days=max(1, days))
+    else:
+        return None, None
+    
+    if start >= end:
+        raise ValueError('from must not be after to')
+    if end - start > timedelta(days=max_days):
+        raise ValueError(f'Date range is limited to {max_days} days')
+    return start, end
+
 @analytics_bp.route('/weak-concepts/<student_id>', methods=['GET'])
 @jwt_required()
+@response_cache.cached(lambda student_id: [('student', student_id)])
 def get_weak_concepts(student_id):
-    """Identify weak concepts for a student"""
+    """Identify weak and strong concepts for a student"""
     student = Student.query.get(student_id)
     
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     
-    # Find questions where student answered wrong
-    from app.models import StudentAnswer, Question
-    
-    wrong_answers = db.session.query(Question.subject, func.count(StudentAnswer.id)).join(
-        StudentAnswer
-    ).filter(
-        StudentAnswer.is_correct == False,
-        QuizAttempt.student_id == student_id
-    ).group_by(Question.subject).all()
+    # Counters are maintained per concept as answers are graded
+    result = concepts.mastery(student_id)
     
     return jsonify({
-        'weak_concepts': [{'subject': w[0], 'error_count': w[1]} for w in wrong_answers]
+        'weak_concepts': result['weak'],
+        'strong_concepts': result['strong']
     }), 200
 
 @analytics_bp.route('/leaderboard/<section_id>', methods=['GET'])
 @jwt_required()
 def section_leaderboard(section_id):
-    """Get section leaderboard"""
-    students = Student.query.filter_by(section_id=section_id).all()
-    
-    leaderboard_data = []
-    for student in students:
-        quiz_attempts = QuizAttempt.query.filter_by(student_id=student.id).all()
-        avg_score = sum(a.percentage for a in quiz_attempts) / len(quiz_attempts) if quiz_attempts else 0
-        
-        leaderboard_data.append({
-            'rank': 0,
-            'student_name': student.user.first_name + ' ' + student.user.last_name,
-            'score': avg_score,
-            'quizzes_taken': len(quiz_attempts)
-        })
-    
-    # Sort by score
-    leaderboard_data.sort(key=lambda x: x['score'], reverse=True)
-    
-    # Assign ranks
-    for i, item in enumerate(leaderboard_data):
-        item['rank'] = i + 1
-    
-    return jsonify(leaderboard_data), 200
+    """Get section leaderboard, one ranked page at a time"""
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    
+    leaderboard_data, total = leaderboards.top(section_id, offset, limit)
+    
+    response = jsonify(leaderboard_data)
+    response.headers['X-Total-Count'] = str(total)
+    return response, 200
+
+@analytics_bp.route('/leaderboard/<section_id>/me', methods=['GET'])
+@jwt_required()
+@require_role(['student'])
+def my_leaderboard_rank(section_id):
+    """Get the current student's rank in a section leaderboard"""
+    user_id = get_jwt_identity()
+    student = Student.query.filter_by(user_id=user_id).first()
+    
+    if not student:
+        return jsonify({'error': 'Student not found'}), 404
+    
+    return jsonify(leaderboards.standing(section_id, student.id)), 200
+
+@analytics_bp.route('/quiz/<quiz_id>/item-analysis', methods=['GET'])
+@jwt_required()
+@require_role(['teacher', 'admin'])
+@response_cache.cached(lambda quiz_id: [('quiz', quiz_id)])
+def quiz_item_analysis(quiz_id):
+    """Get per-question difficulty, discrimination and distractor effectiveness"""
+    from app.models import Quiz
+    
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz:
+        return jsonify({'error': 'Quiz not found'}), 404
+    
+    return jsonify({
+        'quiz_id': quiz.id,
+        'title': quiz.title,
+        'items': item_analysis.quiz_item_analysis(quiz_id)
+    }), 200
+
+@analytics_bp.route('/export/<kind>', methods=['GET'])
+@jwt_required()
+@require_role(['teacher', 'admin'])
+def export_data(kind):
+    """Stream quiz attempts, answers or submissions as CSV or NDJSON"""
+    if kind not in export.EXPORTS:
+        return jsonify({'error': f'Export must be one of: {", ".join(export.EXPORTS)}'}), 404
+    
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    try:
+        start, end = export.parse_range(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    institution_id = request.args.get('institution_id')
+    section_id = request.args.get('section_id')
+    
+    # Teachers export only their own institution or sections; admins may export everything
+    user = User.query.get(get_jwt_identity())
+    if user.role.value != 'admin':
+        if not institution_id and not section_id:
+            return jsonify({'error': 'institution_id or section_id required'}), 400
+        teacher = Teacher.query.filter_by(user_id=user.id).first()
+        if not teacher or not export.teacher_may_export(teacher, institution_id, section_id):
+            return jsonify({'error': 'Export is limited to your own institution and sections'}), 403
+    
+    query = export.build_query(
+        kind,
+        institution_id=institution_id,
+        section_id=section_id,
+        start=start,
+        end=end
+    )
+    
+    # No Content-Length, so the body goes out with chunked transfer encoding
+    rows = export.stream_rows(query, fmt, current_app.config['EXPORT_BATCH_SIZE'])
+    response = Response(stream_with_context(rows), mimetype=export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
@@ -2,7 +2,9 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import DoubtRoom, DoubtMessage, Student, Teacher, User, doubt_room_members
+from app.middleware import etag_version
 from app.utils.decorators import require_role
+from sqlalchemy import func, case
 from datetime import datetime, timedelta
 
 doubt_bp = Blueprint('doubt', __name__)
@@ -47,8 +49,31 @@ def create_doubt_room():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def doubt_room_version(room_id):
+    """Cheap version key for a room: its state plus message count, latest message and votes"""
+    room_state = db.session.query(
+        DoubtRoom.status, DoubtRoom.expiry_time, DoubtRoom.teacher_id
+    ).filter(DoubtRoom.id == room_id).first()
+    if not room_state:
+        return None
+    
+    status, expiry_time, teacher_id = room_state
+    if status == 'active' and datetime.utcnow() > expiry_time:
+        # The view will close the room, let it run
+        return None
+    
+    message_state = db.session.query(
+        func.count(DoubtMessage.id),
+        func.max(DoubtMessage.created_at),
+        func.sum(DoubtMessage.votes),
+        func.sum(case((DoubtMessage.is_best_answer == True, 1), else_=0))
+    ).filter(DoubtMessage.room_id == room_id).one()
+    
+    return (status, teacher_id) + tuple(message_state)
+
 @doubt_bp.route('/<room_id>', methods=['GET'])
 @jwt_required()
+@etag_version(doubt_room_version)
 def get_doubt_room(room_id):
     """Get doubt room details"""
     room = DoubtRoom.query.get(room_id)
@@ -1,18 +1,61 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Quiz, Question, QuestionOption, QuizAttempt, StudentAnswer, Student
+from app.models import Quiz, QuizAttempt, Student
+from app.services.admission import admission
+from app.services.ai_grading import ai_grading_queue
+from app.services.autosave import save_answer
+from app.services.completion import attempt_completed
+from app.services.grading import GradingEngine, stored_answers
+from app.services.quiz_cache import quiz_cache
+from app.services.response_cache import bump_after_commit
+from app.services.question_import import QuestionImporter, open_text_stream
+from app.services.shuffle import attempt_seed, shuffle_paper
+from app.services import item_analysis, concepts
+from app.middleware import etag_version
 from app.utils.decorators import require_role
+from app.utils.pagination import keyset_paginate, parse_page_size
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 quiz_bp = Blueprint('quiz', __name__)
 
+ATTEMPT_ALLOCATION_RETRIES = 3
+
+IMPORT_CONTENT_TYPES = {
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'text/csv': 'csv'
+}
+
 @quiz_bp.route('', methods=['GET'])
 @jwt_required()
 def get_quizzes():
-    """Get all available quizzes"""
-    quizzes = Quiz.query.filter_by(is_published=True).all()
-    return jsonify([{
+    """Get available quizzes, newest first, one keyset page at a time"""
+    query = Quiz.query.filter(Quiz.is_published == True)
+    
+    section_id = request.args.get('section_id')
+    subject = request.args.get('subject')
+    difficulty = request.args.get('difficulty_level') or request.args.get('difficulty')
+    
+    if section_id:
+        query = query.filter(Quiz.section_id == section_id)
+    if subject:
+        query = query.filter(Quiz.subject == subject)
+    if difficulty:
+        query = query.filter(Quiz.difficulty_level == difficulty)
+    
+    try:
+        quizzes, next_cursor = keyset_paginate(
+            query, Quiz.created_at, Quiz.id,
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify([{
         'id': q.id,
         'title': q.title,
         'description': q.description,
@@ -20,31 +63,83 @@ def get_quizzes():
         'difficulty': q.difficulty_level,
         'total_points': q.total_points,
         'duration': q.duration_minutes
-    } for q in quizzes]), 200
+    } for q in quizzes])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
 @quiz_bp.route('/<quiz_id>', methods=['GET'])
 @jwt_required()
+@etag_version(lambda quiz_id: quiz_cache.current_version(quiz_id))
 def get_quiz(quiz_id):
-    """Get quiz details"""
+    """Get quiz details, in the attempt's own order when attempt_id is given"""
+    paper = quiz_cache.get_paper(quiz_id)
+    if not paper:
+        return jsonify({'error': 'Quiz not found'}), 404
+    
+    attempt_id = request.args.get('attempt_id')
+    if attempt_id and (paper['shuffle_questions'] or paper['shuffle_options']):
+        attempt = db.session.query(QuizAttempt.student_id, QuizAttempt.attempt_number).join(
+            Student, Student.id == QuizAttempt.student_id
+        ).filter(
+            QuizAttempt.id == attempt_id,
+            QuizAttempt.quiz_id == quiz_id,
+            Student.user_id == get_jwt_identity()
+        ).first()
+        
+        if not attempt:
+            return jsonify({'error': 'Attempt not found'}), 404
+        
+        paper = shuffle_paper(paper, attempt_seed(quiz_id, attempt.student_id, attempt.attempt_number))
+    
+    return jsonify(paper), 200
+
+@quiz_bp.route('/<quiz_id>/questions/import', methods=['POST'])
+@jwt_required()
+@require_role(['teacher', 'admin'])
+def import_questions(quiz_id):
+    """Bulk import questions from a JSON Lines or CSV question bank"""
     quiz = Quiz.query.get(quiz_id)
     if not quiz:
         return jsonify({'error': 'Quiz not found'}), 404
     
-    return jsonify({
-        'id': quiz.id,
-        'title': quiz.title,
-        'description': quiz.description,
-        'questions': [{
-            'id': q.id,
-            'type': q.question_type,
-            'text': q.question_text,
-            'points': q.points,
-            'options': [{
-                'id': o.id,
-                'text': o.option_text
-            } for o in q.options] if q.question_type == 'mcq' else []
-        } for q in quiz.questions]
-    }), 200
+    if 'file' in request.files:
+        file = request.files['file']
+        stream = file.stream
+        source_format = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    else:
+        stream = request.stream
+        source_format = IMPORT_CONTENT_TYPES.get(request.mimetype, '')
+    
+    source_format = request.args.get('format', source_format).lower()
+    if source_format == 'ndjson':
+        source_format = 'jsonl'
+    if source_format not in ('jsonl', 'csv'):
+        return jsonify({'error': 'Format must be jsonl or csv'}), 400
+    
+    try:
+        importer = QuestionImporter(quiz_id)
+        text_stream = open_text_stream(stream)
+        records = importer.iter_csv(text_stream) if source_format == 'csv' else importer.iter_jsonl(text_stream)
+        summary = importer.run(records)
+        
+        # Core inserts skip the mapper events, so bump the quiz version here
+        quiz.updated_at = datetime.utcnow()
+        db.session.commit()
+        quiz_cache.invalidate(quiz_id)
+        
+        return jsonify({
+            'message': 'Import finished',
+            **summary
+        }), 200
+    
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'File must be UTF-8 encoded'}), 400
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
 @quiz_bp.route('/<quiz_id>/attempt', methods=['POST'])
 @jwt_required()
@@ -52,6 +147,14 @@ def get_quiz(quiz_id):
 def start_quiz_attempt(quiz_id):
     """Start a quiz attempt"""
     user_id = get_jwt_identity()
+    
+    # Smooth exam-start bursts: queue briefly rather than hitting the database all at once
+    admitted, retry_after = admission.exam_start.acquire()
+    if not admitted:
+        response = jsonify({'error': 'Too many quiz starts, please retry', 'retry_after': round(retry_after, 1)})
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response, 429
+    
     student = Student.query.filter_by(user_id=user_id).first()
     
     if not student:
@@ -61,30 +164,91 @@ def start_quiz_attempt(quiz_id):
     if not quiz:
         return jsonify({'error': 'Quiz not found'}), 404
     
-    # Check previous attempts
-    previous_attempts = QuizAttempt.query.filter_by(
-        quiz_id=quiz_id,
-        student_id=student.id
-    ).count()
+    for _ in range(ATTEMPT_ALLOCATION_RETRIES):
+        previous_attempts = db.session.query(
+            QuizAttempt.id, QuizAttempt.attempt_number, QuizAttempt.status
+        ).filter(
+            QuizAttempt.quiz_id == quiz_id,
+            QuizAttempt.student_id == student.id
+        ).all()
+        
+        # A repeated start (double click, client retry) resumes the open attempt
+        in_progress = [a for a in previous_attempts if a.status == 'in_progress']
+        if in_progress:
+            return jsonify({
+                'attempt_id': in_progress[0].id,
+                'attempt_number': in_progress[0].attempt_number,
+                'quiz_id': quiz_id
+            }), 200
+        
+        if len(previous_attempts) >= quiz.max_retakes:
+            return jsonify({'error': 'Maximum attempts exceeded'}), 403
+        
+        try:
+            # The unique (quiz_id, student_id, attempt_number) constraint makes the allocation atomic
+            attempt = QuizAttempt(
+                quiz_id=quiz_id,
+                student_id=student.id,
+                attempt_number=max((a.attempt_number or 0 for a in previous_attempts), default=0) + 1,
+                status='in_progress'
+            )
+            db.session.add(attempt)
+            db.session.commit()
+            
+            return jsonify({
+                'attempt_id': attempt.id,
+                'attempt_number': attempt.attempt_number,
+                'quiz_id': quiz_id
+            }), 201
+        
+        except IntegrityError:
+            # A concurrent start took this number, re-read and try again
+            db.session.rollback()
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'error': 'Could not allocate attempt, please retry'}), 409
+
+@quiz_bp.route('/attempt/<attempt_id>/answer', methods=['PUT'])
+@jwt_required()
+@require_role(['student'])
+def autosave_answer(attempt_id):
+    """Autosave a single answer of an in-progress attempt"""
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not data or not data.get('question_id'):
+        return jsonify({'error': 'question_id required'}), 400
     
-    if previous_attempts >= quiz.max_retakes:
-        return jsonify({'error': 'Maximum attempts exceeded'}), 403
+    attempt = db.session.query(QuizAttempt.quiz_id, QuizAttempt.status).join(
+        Student, Student.id == QuizAttempt.student_id
+    ).filter(
+        QuizAttempt.id == attempt_id,
+        Student.user_id == user_id
+    ).first()
+    
+    if not attempt:
+        return jsonify({'error': 'Attempt not found'}), 404
+    
+    if attempt.status != 'in_progress':
+        return jsonify({'error': 'Attempt already submitted'}), 409
+    
+    answer_key = quiz_cache.get_answer_key(attempt.quiz_id)
+    question = answer_key.questions.get(data['question_id'])
+    if question is None:
+        return jsonify({'error': 'Question not in this quiz'}), 400
     
     try:
-        attempt = QuizAttempt(
-            quiz_id=quiz_id,
-            student_id=student.id,
-            attempt_number=previous_attempts + 1,
-            status='in_progress'
-        )
-        db.session.add(attempt)
+        selected = GradingEngine.selected_options(data) & question['options']
+        saved = save_answer(attempt_id, data['question_id'], selected, data.get('text'))
         db.session.commit()
         
-        return jsonify({
-            'attempt_id': attempt.id,
-            'attempt_number': attempt.attempt_number,
-            'quiz_id': quiz_id
-        }), 201
+        if not saved:
+            return jsonify({'error': 'Attempt already submitted'}), 409
+        
+        return jsonify({'message': 'Answer saved'}), 200
     
     except Exception as e:
         db.session.rollback()
@@ -92,54 +256,56 @@ def start_quiz_attempt(quiz_id):
 
 @quiz_bp.route('/attempt/<attempt_id>/submit', methods=['POST'])
 @jwt_required()
+@require_role(['student'])
 def submit_quiz_attempt(attempt_id):
     """Submit quiz answers"""
-    data = request.get_json()
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
     
-    attempt = QuizAttempt.query.get(attempt_id)
+    attempt = QuizAttempt.query.join(
+        Student, Student.id == QuizAttempt.student_id
+    ).filter(
+        QuizAttempt.id == attempt_id,
+        Student.user_id == user_id
+    ).first()
     if not attempt:
         return jsonify({'error': 'Attempt not found'}), 404
     
     try:
-        answers = data.get('answers', [])
-        total_score = 0
+        # Claim the attempt so concurrent submits cannot both grade it and count it twice
+        claimed = db.session.execute(
+            update(QuizAttempt).where(
+                QuizAttempt.id == attempt_id,
+                QuizAttempt.status == 'in_progress'
+            ).values(status='submitted').execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({'error': 'Attempt already submitted'}), 409
         
-        for answer_data in answers:
-            question = Question.query.get(answer_data['question_id'])
-            
-            answer = StudentAnswer(
-                attempt_id=attempt_id,
-                question_id=answer_data['question_id'],
-                selected_option_id=answer_data.get('option_id'),
-                answer_text=answer_data.get('text')
-            )
-            
-            if question.question_type == 'mcq':
-                correct_option = QuestionOption.query.filter_by(
-                    question_id=question.id,
-                    is_correct=True
-                ).first()
-                
-                if answer.selected_option_id == correct_option.id:
-                    answer.is_correct = True
-                    answer.points_earned = question.points
-                    total_score += question.points
-                else:
-                    answer.is_correct = False
-                    answer.points_earned = 0
-            
-            db.session.add(answer)
+        # Grade what autosave already stored, overlaid with anything sent now
+        answers = stored_answers(attempt_id)
+        for answer_data in data.get('answers', []):
+            answers[answer_data.get('question_id')] = answer_data
         
-        attempt.status = 'completed'
-        attempt.score = total_score
-        attempt.total_points = sum(q.points for q in attempt.quiz.questions)
-        attempt.percentage = (total_score / attempt.total_points * 100) if attempt.total_points > 0 else 0
-        attempt.completed_at = datetime.utcnow()
+        answer_key = quiz_cache.get_answer_key(attempt.quiz_id)
+        rows = GradingEngine(answer_key).grade(attempt, answers.values())
+        concepts.record_answers(attempt.student_id, answer_key, rows)
+        bump_after_commit(('quiz', attempt.quiz_id), ('student', attempt.student_id))
+        if attempt.status == 'completed':
+            # Attempts waiting on AI grading are recorded by ai_grading.finalize_attempt
+            item_analysis.record_attempt(attempt, answer_key, rows)
+            attempt_completed(attempt.student_id, attempt.quiz_id, attempt.percentage)
         
         db.session.commit()
         
+        # Descriptive/coding answers are graded in the background
+        pending = ai_grading_queue.enqueue_attempt(attempt_id) if attempt.status == 'submitted' else 0
+        
         return jsonify({
             'message': 'Quiz submitted successfully',
+            'status': attempt.status,
+            'pending_ai_grading': pending,
             'score': attempt.score,
             'total': attempt.total_points,
             'percentage': attempt.percentage
@@ -1,21 +1,99 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, url_for, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
 from app import db
-from app.models import User, Submission, Assignment, Student
+from app.models import Submission, Assignment, Student, Teacher, AnalysisJob, StoredFile
 from app.services.ai_service import AIAnalysisService
-from app.services.file_processor import FileProcessor
+from app.services import performance
+from app.services.access import record_upload, may_read_file
+from app.services.blob_store import blob_store
+from app.services.analysis_jobs import analysis_jobs
+from app.services.pdf_index import pdf_index
+from app.services.upload_stream import receive, UploadRejected
+from app.services.ai_cache import bypass_requested
+from app.services.response_cache import bump_after_commit, student_scopes
 from app.utils.decorators import require_role
+from sqlalchemy import update
 from datetime import datetime
-import os
 
 upload_bp = Blueprint('upload', __name__)
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'mp3', 'wav', 'jpg', 'jpeg', 'png', 'py', 'csv'}
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def receive_upload(kind, extensions, type_error='File type not allowed', reference=True):
+    """Stream the request's file into the blob store under the endpoint's size limit.
+
+    Returns (blob, form fields); raises UploadRejected (400/413/415).
+    Pass reference=False when no record will own the file; it is then
+    kept until it has gone unused for TEMP_FILE_EXPIRATION. The caller is
+    recorded as an uploader, so the PDF endpoints serve the file back to them.
+    """
+    blob, fields = receive(
+        request, extensions, current_app.config['UPLOAD_LIMITS'][kind], type_error, reference=reference
+    )
+    if blob:
+        record_upload(get_jwt_identity(), blob.sha256)
+    return blob, fields
+
+def readable_pdf(sha256):
+    """StoredFile of a PDF the caller may read, or None (unknown, not a PDF or someone else's upload)"""
+    blob = db.session.get(StoredFile, sha256)
+    if not blob or blob.extension != '.pdf' or not may_read_file(get_jwt_identity(), sha256):
+        return None
+    return blob
+
+def accepted(job, message, **extra):
+    """202 response pointing at the job's status endpoint"""
+    status_url = url_for('upload.get_job', job_id=job.id)
+    response = jsonify({
+        'message': message,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': status_url,
+        **extra
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def pdf_page_range(values):
+    """1-based (page_start, page_end) from request values, capped at PDF_READ_MAX_PAGES pages"""
+    max_pages = current_app.config['PDF_READ_MAX_PAGES']
+    try:
+        page_start = int(values.get('page_start', 1))
+        page_end = int(values.get('page_end', page_start + max_pages - 1))
+    except ValueError:
+        raise ValueError('page_start and page_end must be integers')
+    
+    if page_start < 1 or page_end < page_start:
+        raise ValueError('page_start must be at least 1 and not after page_end')
+    
+    return page_start, min(page_end, page_start + max_pages - 1)
+
+def pdf_data(blob, page_start, page_end):
+    """Requested pages of a stored PDF, served from its page index (built on first read).
+
+    Scanned pages are OCR'd on first request, only within the requested range.
+    """
+    index = pdf_index.get_or_build(blob.sha256, blob.file_path)
+    pdf_index.fill_ocr(blob.sha256, blob.file_path, index, page_start, page_end)
+    pages = index.pages(page_start, page_end)
+    page_end = min(page_end, index.total_pages)
+    
+    data = {
+        'sha256': blob.sha256,
+        'total_pages': index.total_pages,
+        'page_start': page_start,
+        'page_end': page_end,
+        'pages': [{
+            'page_number': number,
+            'text': text,
+            'word_count': word_count
+        } for number, text, word_count in pages],
+        'file_path': blob.file_path
+    }
+    if page_end < index.total_pages:
+        data['next_page_start'] = page_end + 1
+    return data
 
 @upload_bp.route('/essay', methods=['POST'])
 @jwt_required()
@@ -28,45 +106,29 @@ def upload_essay():
     if not student:
         return jsonify({'error': 'Student profile not found'}), 404
     
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    # Stored by content; identical uploads share the file and its extracted text
+    try:
+        blob, _ = receive_upload('essay', ALLOWED_EXTENSIONS)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'File type not allowed'}), 400
+    if not blob:
+        return jsonify({'error': 'No file provided'}), 400
     
     try:
-        # Save file
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Process file
-        file_processor = FileProcessor()
-        essay_text = file_processor.extract_text(filepath)
-        
-        # AI Analysis
-        ai_service = AIAnalysisService()
-        analysis = ai_service.analyze_essay(
-            essay_text,
-            student.user.first_name,
-            request.args.get('mode', 'student')  # student, teacher, parent
+        # Extraction and AI analysis run in the background
+        job = analysis_jobs.create(
+            user_id, 'essay', blob,
+            mode=request.args.get('mode', 'student'),  # student, teacher, parent
+            refresh=bypass_requested(request.args)
         )
+        db.session.commit()
+        analysis_jobs.start(job.id)
         
-        return jsonify({
-            'message': 'Essay analyzed successfully',
-            'analysis': analysis,
-            'file_path': filepath
-        }), 200
+        return accepted(job, 'Essay queued for analysis')
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @upload_bp.route('/code', methods=['POST'])
@@ -80,36 +142,23 @@ def upload_code():
     if not student:
         return jsonify({'error': 'Student profile not found'}), 404
     
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
+    try:
+        blob, _ = receive_upload('code', {'py'}, 'Only Python files allowed')
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if not file.filename.endswith('.py'):
-        return jsonify({'error': 'Only Python files allowed'}), 400
+    if not blob:
+        return jsonify({'error': 'No file provided'}), 400
     
     try:
-        # Save file
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Read code
-        with open(filepath, 'r') as f:
-            code_text = f.read()
-        
-        # AI Analysis
-        ai_service = AIAnalysisService()
-        analysis = ai_service.analyze_code(code_text)
+        job = analysis_jobs.create(user_id, 'code', blob, refresh=bypass_requested(request.args))
+        db.session.commit()
+        analysis_jobs.start(job.id)
         
-        return jsonify({
-            'message': 'Code analyzed successfully',
-            'analysis': analysis,
-            'file_path': filepath
-        }), 200
+        return accepted(job, 'Code queued for analysis')
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @upload_bp.route('/audio', methods=['POST'])
@@ -119,100 +168,123 @@ def upload_audio():
     """Upload and analyze audio"""
     user_id = get_jwt_identity()
     
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
+    try:
+        blob, _ = receive_upload('audio', {'mp3', 'wav', 'm4a'}, 'Only audio files allowed')
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if not file.filename.lower().endswith(('.mp3', '.wav', '.m4a')):
-        return jsonify({'error': 'Only audio files allowed'}), 400
+    if not blob:
+        return jsonify({'error': 'No file provided'}), 400
     
     try:
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Process audio
-        file_processor = FileProcessor()
-        transcription = file_processor.speech_to_text(filepath)
-        
-        # AI Analysis
-        ai_service = AIAnalysisService()
-        analysis = ai_service.analyze_audio(transcription, filepath)
+        job = analysis_jobs.create(user_id, 'audio', blob, refresh=bypass_requested(request.args))
+        db.session.commit()
+        analysis_jobs.start(job.id)
         
-        return jsonify({
-            'message': 'Audio analyzed successfully',
-            'transcription': transcription,
-            'analysis': analysis,
-            'file_path': filepath
-        }), 200
+        return accepted(job, 'Audio queued for analysis')
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @upload_bp.route('/image', methods=['POST'])
 @jwt_required()
 def upload_image():
     """Upload and analyze image"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    user_id = get_jwt_identity()
     
-    file = request.files['file']
+    try:
+        blob, _ = receive_upload('image', {'jpg', 'jpeg', 'png', 'gif'}, 'Only image files allowed')
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if not file.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-        return jsonify({'error': 'Only image files allowed'}), 400
+    if not blob:
+        return jsonify({'error': 'No file provided'}), 400
     
     try:
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Process image
-        file_processor = FileProcessor()
-        text_extracted = file_processor.ocr_image(filepath)
-        
-        # AI Analysis
-        ai_service = AIAnalysisService()
-        analysis = ai_service.analyze_image(filepath, text_extracted)
+        job = analysis_jobs.create(user_id, 'image', blob, refresh=bypass_requested(request.args))
+        db.session.commit()
+        analysis_jobs.start(job.id)
         
-        return jsonify({
-            'message': 'Image analyzed successfully',
-            'extracted_text': text_extracted,
-            'analysis': analysis,
-            'file_path': filepath
-        }), 200
+        return accepted(job, 'Image queued for analysis')
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @upload_bp.route('/pdf/read', methods=['POST'])
 @jwt_required()
 def pdf_intelligent_read():
     """Upload PDF and get intelligent reading support"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    try:
+        # Nothing owns a PDF read, so no reference is taken; prune-blobs reclaims it once unused
+        blob, form = receive_upload('pdf', {'pdf'}, 'Only PDF files allowed', reference=False)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
-    file = request.files['file']
+    if not blob:
+        return jsonify({'error': 'No file provided'}), 400
     
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({'error': 'Only PDF files allowed'}), 400
+    # Only the pages the client displays are returned
+    try:
+        page_start, page_end = pdf_page_range({**request.args.to_dict(), **form})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     
     try:
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Extract PDF text and metadata
-        file_processor = FileProcessor()
-        pdf_content = file_processor.extract_pdf_content(filepath)
+        db.session.commit()
         
         return jsonify({
             'message': 'PDF loaded successfully',
-            'pdf_data': pdf_content,
-            'file_path': filepath
+            'pdf_data': pdf_data(blob, page_start, page_end),
+            'file_path': blob.file_path
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/pdf/<sha256>', methods=['GET'])
+@jwt_required()
+def get_pdf_pages(sha256):
+    """Get pages of an already uploaded PDF by content hash, without re-uploading it"""
+    blob = readable_pdf(sha256)
+    if not blob:
+        return jsonify({'error': 'PDF not found'}), 404
+    
+    try:
+        page_start, page_end = pdf_page_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify({'pdf_data': pdf_data(blob, page_start, page_end)}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/pdf/<sha256>/search', methods=['GET'])
+@jwt_required()
+def pdf_search(sha256):
+    """Find the pages of an uploaded PDF that contain a word"""
+    word = request.args.get('q', '').strip()
+    if not word:
+        return jsonify({'error': 'q required'}), 400
+    
+    blob = readable_pdf(sha256)
+    if not blob:
+        return jsonify({'error': 'PDF not found'}), 404
+    
+    try:
+        index = pdf_index.get_or_build(blob.sha256, blob.file_path)
+        return jsonify({
+            'sha256': sha256,
+            'query': word,
+            'total_pages': index.total_pages,
+            'matches': index.search(word),
+            # Scanned pages become searchable once they have been read
+            'ocr_pending_pages': len(index.pending_ocr())
         }), 200
     
     except Exception as e:
@@ -231,7 +303,7 @@ def get_word_definition():
     context = data.get('context', '')
     
     try:
-        ai_service = AIAnalysisService()
+        ai_service = AIAnalysisService(use_cache=not bypass_requested(request.args))
         definition = ai_service.get_word_definition(word, context)
         
         return jsonify({
@@ -266,26 +338,24 @@ def submit_assignment(assignment_id):
     if existing and existing.status != 'draft':
         return jsonify({'error': 'Assignment already submitted'}), 409
     
+    # The file is optional; other form fields arrive with it in the same stream
+    try:
+        blob, form = receive_upload('submission', ALLOWED_EXTENSIONS, 'Invalid file')
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    filepath = blob.file_path if blob else None
+    submission_text = form.get('text', '')
+    
+    if not filepath and not submission_text:
+        return jsonify({'error': 'No content provided'}), 400
+    
     try:
-        if 'file' in request.files:
-            file = request.files['file']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                upload_folder = current_app.config['UPLOAD_FOLDER']
-                filepath = os.path.join(upload_folder, filename)
-                file.save(filepath)
-            else:
-                return jsonify({'error': 'Invalid file'}), 400
-        else:
-            filepath = None
-        
-        submission_text = request.form.get('text', '')
-        
-        if not filepath and not submission_text:
-            return jsonify({'error': 'No content provided'}), 400
-        
         if existing:
+            # Resubmitting a draft drops its reference to the previous file
+            blob_store.release(existing.file_hash)
             existing.file_path = filepath
+            existing.file_hash = blob.sha256 if blob else None
             existing.submission_text = submission_text
             existing.submission_date = datetime.utcnow()
             existing.status = 'submitted'
@@ -295,31 +365,142 @@ def submit_assignment(assignment_id):
                 assignment_id=assignment_id,
                 student_id=student.id,
                 file_path=filepath,
+                file_hash=blob.sha256 if blob else None,
                 submission_text=submission_text,
                 status='submitted',
                 submission_date=datetime.utcnow()
             )
             db.session.add(submission)
         
+        db.session.flush()
+        
+        # AI feedback is generated in the background and stored on the submission
+        job = analysis_jobs.create(
+            user_id, 'submission', blob, submission_id=submission.id, refresh=bypass_requested(request.args)
+        )
+        bump_after_commit(*student_scopes(student.id))
         db.session.commit()
+        analysis_jobs.start(job.id)
         
-        # Generate AI feedback
-        ai_service = AIAnalysisService()
-        if filepath:
-            file_processor = FileProcessor()
-            content = file_processor.extract_text(filepath)
-        else:
-            content = submission_text
+        return accepted(job, 'Assignment submitted successfully', submission_id=submission.id)
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get an analysis job's status and result; ?wait=<seconds> long-polls until it finishes"""
+    user_id = get_jwt_identity()
+    
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), current_app.config['ANALYSIS_JOB_MAX_WAIT'])
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    job = AnalysisJob.query.get(job_id)
+    if not job or job.user_id != user_id:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if wait:
+        job = analysis_jobs.wait(job_id, wait)
+    
+    return jsonify({
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'submission_id': job.submission_id,
+        'result': job.result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }), 200
+
+@upload_bp.route('/submission/<submission_id>/grade', methods=['PUT'])
+@jwt_required()
+@require_role(['teacher'])
+def grade_submission(submission_id):
+    """Grade a submitted assignment"""
+    user_id = get_jwt_identity()
+    submission = Submission.query.join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).join(
+        Teacher, Teacher.id == Assignment.teacher_id
+    ).filter(
+        Submission.id == submission_id,
+        Teacher.user_id == user_id
+    ).first()
+    
+    # Only the teacher who set the assignment may grade it
+    if not submission:
+        return jsonify({'error': 'Submission not found'}), 404
+    
+    if submission.status == 'draft':
+        return jsonify({'error': 'Submission not submitted yet'}), 409
+    
+    data = request.get_json()
+    
+    try:
+        grade = int(data['grade'])
+    except (TypeError, KeyError, ValueError):
+        return jsonify({'error': 'Grade required'}), 400
+    
+    max_points = submission.assignment.max_points
+    if grade < 0 or (max_points is not None and grade > max_points):
+        return jsonify({'error': f'Grade must be between 0 and {max_points}'}), 400
+    
+    values = {
+        'grade': grade,
+        'teacher_feedback': data.get('feedback', submission.teacher_feedback),
+        'status': 'graded',
+        'graded_by': user_id,
+        'graded_date': datetime.utcnow()
+    }
+    
+    try:
+        # Claim the first grade, or replace exactly the grade read here, so concurrent
+        # gradings cannot both count the submission in the averages
+        previous_grade = None
+        claimed = db.session.execute(
+            update(Submission).where(
+                Submission.id == submission_id,
+                Submission.status.notin_(('graded', 'draft'))
+            ).values(**values).execution_options(synchronize_session=False)
+        ).rowcount
+        
+        if claimed != 1:
+            previous_grade = db.session.query(Submission.grade).filter(
+                Submission.id == submission_id,
+                Submission.status == 'graded'
+            ).scalar()
+            claimed = db.session.execute(
+                update(Submission).where(
+                    Submission.id == submission_id,
+                    Submission.status == 'graded',
+                    Submission.grade == previous_grade
+                ).values(**values).execution_options(synchronize_session=False)
+            ).rowcount
+        
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({'error': 'Submission is being graded, please retry'}), 409
+        
+        # Keep the student's running averages in the same transaction
+        performance.record_submission_grade(
+            submission.student_id, submission.assignment.subject, grade, previous_grade
+        )
+        bump_after_commit(*student_scopes(submission.student_id))
         
-        feedback = ai_service.analyze_essay(content, 'Assignment')
-        submission.ai_feedback = str(feedback)
         db.session.commit()
         
         return jsonify({
-            'message': 'Assignment submitted successfully',
+            'message': 'Submission graded',
             'submission_id': submission.id,
-            'ai_feedback': feedback
-        }), 201
+            'grade': grade
+        }), 200
     
     except Exception as e:
         db.session.rollback()
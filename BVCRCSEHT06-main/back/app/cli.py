@@ -0,0 +1,74 @@
+from app import db
+from app.models import Quiz
+import click
+
+def register_commands(app):
+    """Add the maintenance commands to `flask`.
+
+    Registered from create_app, because `flask` loads the app through the
+    factory and never runs app.py.
+    """
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema():
+        """Add columns, indexes and constraints that models gained since the database was created"""
+        from app.utils.schema import upgrade_schema as run_upgrade
+        
+        statements = run_upgrade()
+        for statement in statements:
+            click.echo(statement)
+        click.echo(f'{len(statements)} schema changes applied')
+    
+    @app.cli.command('recompute-item-stats')
+    @click.argument('quiz_id', required=False)
+    def recompute_item_stats(quiz_id):
+        """Rebuild item-analysis statistics for one quiz or all quizzes"""
+        from app.services import item_analysis
+        from app.services.grading import AnswerKey
+        from app.services.response_cache import response_cache
+        
+        quiz_ids = [quiz_id] if quiz_id else [q.id for q in Quiz.query.with_entities(Quiz.id)]
+        for qid in quiz_ids:
+            attempts = item_analysis.recompute_quiz(qid, AnswerKey.load(qid))
+            db.session.commit()
+            click.echo(f'{qid}: {attempts} attempts')
+        response_cache.clear()
+    
+    @app.cli.command('regrade-pending')
+    def regrade_pending():
+        """Re-enqueue AI grading for attempts stuck in 'submitted'"""
+        from app.services.ai_grading import ai_grading_queue
+        
+        queued = ai_grading_queue.enqueue_pending()
+        click.echo(f'{queued} answers queued')
+        ai_grading_queue.shutdown()
+    
+    @app.cli.command('rebuild-performance')
+    @click.argument('student_id', required=False)
+    def rebuild_performance(student_id):
+        """Recompute Performance aggregates, concept counters and leaderboards from raw answers and grades"""
+        from app.services import performance, concepts
+        from app.services.leaderboard import leaderboards
+        from app.services.response_cache import response_cache
+        
+        rows = performance.rebuild(student_id)
+        concept_rows = concepts.rebuild(student_id)
+        ranked = leaderboards.rebuild()
+        db.session.commit()
+        response_cache.clear()
+        click.echo(f'{rows} performance rows rebuilt, {concept_rows} concept counters rebuilt, {ranked} students ranked')
+    
+    @app.cli.command('prune-blobs')
+    def prune_blobs():
+        """Delete stored uploads no longer referenced by anything"""
+        from app.services.blob_store import blob_store
+        
+        removed = blob_store.prune(app.config['TEMP_FILE_EXPIRATION'])
+        click.echo(f'{removed} files removed')
+    
+    @app.cli.command('prune-jobs')
+    def prune_jobs():
+        """Delete finished upload analysis jobs past their retention"""
+        from app.services.analysis_jobs import analysis_jobs
+        
+        removed = analysis_jobs.prune(app.config['ANALYSIS_JOB_RETENTION'])
+        click.echo(f'{removed} jobs removed')
@@ -1 +1,4 @@
 # Middleware module initialization
+from app.middleware.etag import init_etag, etag_version
+
+__all__ = ['init_etag', 'etag_version']
@@ -0,0 +1,60 @@
+from functools import wraps
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+import hashlib
+
+def init_etag(app):
+    """Register the conditional-GET response hook"""
+    app.after_request(add_etag)
+
+def add_etag(response):
+    """Attach a strong ETag to JSON GET responses and answer If-None-Match with 304"""
+    if request.method != 'GET' or response.status_code != 200:
+        return response
+    if response.direct_passthrough or not response.is_json:
+        return response
+
+    if not response.get_etag()[0]:
+        response.add_etag()
+
+    # Responses are per-user, so only the client may store them and must revalidate
+    response.headers.setdefault('Cache-Control', 'private, no-cache')
+    return response.make_conditional(request)
+
+def version_etag(version):
+    """Build the ETag for a version key scoped to the current URL and user"""
+    try:
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+
+    raw = repr((request.full_path, identity, version)).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def etag_version(version_func):
+    """Decorator to decide a 304 from a cheap version key before the view runs.
+
+    version_func receives the view's keyword arguments and returns any
+    repr()-stable value (e.g. updated_at) or None to skip the check.
+    Must be applied below @jwt_required so the identity is available.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            version = version_func(**kwargs)
+            if version is None:
+                return fn(*args, **kwargs)
+
+            tag = version_etag(version)
+            if request.if_none_match.contains(tag):
+                response = make_response('', 304)
+                response.set_etag(tag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(tag)
+            return response
+        return wrapper
+    return decorator
@@ -126,6 +126,8 @@ class Student(db.Model):
     submissions = db.relationship('Submission', backref='student', cascade='all, delete-orphan')
     quiz_attempts = db.relationship('QuizAttempt', backref='student', cascade='all, delete-orphan')
     performances = db.relationship('Performance', backref='student', cascade='all, delete-orphan')
+    leaderboard_score = db.relationship('LeaderboardScore', uselist=False, cascade='all, delete-orphan')
+    concept_mastery = db.relationship('ConceptMastery', cascade='all, delete-orphan')
     doubt_rooms = db.relationship('DoubtRoom', secondary='doubt_room_members', backref='student_members')
     
     def __repr__(self):
@@ -189,6 +191,8 @@ class Quiz(db.Model):
     allow_retake = db.Column(db.Boolean, default=True)
     max_retakes = db.Column(db.Integer, default=3)
     show_answers_after = db.Column(db.Boolean, default=True)
+    shuffle_questions = db.Column(db.Boolean, default=False)  # Per-attempt order, derived from a seed
+    shuffle_options = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -196,6 +200,14 @@ class Quiz(db.Model):
     questions = db.relationship('Question', backref='quiz', cascade='all, delete-orphan')
     attempts = db.relationship('QuizAttempt', backref='quiz', cascade='all, delete-orphan')
     
+    # Composite indexes backing the keyset-paginated catalogue filters
+    __table_args__ = (
+        db.Index('ix_quizzes_published_created', 'is_published', 'created_at', 'id'),
+        db.Index('ix_quizzes_section_created', 'is_published', 'section_id', 'created_at', 'id'),
+        db.Index('ix_quizzes_subject_created', 'is_published', 'subject', 'created_at', 'id'),
+        db.Index('ix_quizzes_difficulty_created', 'is_published', 'difficulty_level', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Quiz {self.title}>'
 
@@ -210,11 +222,13 @@ class Question(db.Model):
     question_image = db.Column(db.String(255))
     points = db.Column(db.Integer, default=1)
     order = db.Column(db.Integer)
+    concepts = db.Column(db.JSON)  # Concept tags, e.g. ["loops", "recursion"]
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     options = db.relationship('QuestionOption', backref='question', cascade='all, delete-orphan')
     answers = db.relationship('StudentAnswer', backref='question', cascade='all, delete-orphan')
+    statistics = db.relationship('QuestionStatistics', uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Question {self.id}>'
@@ -231,6 +245,9 @@ class QuestionOption(db.Model):
     order = db.Column(db.Integer)
     explanation = db.Column(db.Text)
     
+    # Relationships
+    statistics = db.relationship('OptionStatistics', uselist=False, cascade='all, delete-orphan')
+    
     def __repr__(self):
         return f'<QuestionOption {self.id}>'
 
@@ -242,7 +259,7 @@ class QuizAttempt(db.Model):
     quiz_id = db.Column(db.String(36), db.ForeignKey('quizzes.id'), nullable=False)
     student_id = db.Column(db.String(36), db.ForeignKey('students.id'), nullable=False)
     attempt_number = db.Column(db.Integer, default=1)
-    score = db.Column(db.Integer)
+    score = db.Column(db.Float)
     total_points = db.Column(db.Integer)
     percentage = db.Column(db.Float)
     status = db.Column(db.String(20), default='in_progress')  # in_progress, completed, submitted
@@ -253,6 +270,12 @@ class QuizAttempt(db.Model):
     # Relationships
     answers = db.relationship('StudentAnswer', backref='attempt', cascade='all, delete-orphan')
     
+    # The unique constraint's index also serves per-quiz attempt lookups
+    __table_args__ = (
+        db.UniqueConstraint('quiz_id', 'student_id', 'attempt_number', name='unique_quiz_student_attempt'),
+        db.Index('ix_attempts_student_completed', 'student_id', 'completed_at'),
+    )
+    
     def __repr__(self):
         return f'<QuizAttempt quiz={self.quiz_id} student={self.student_id}>'
 
@@ -264,15 +287,58 @@ class StudentAnswer(db.Model):
     attempt_id = db.Column(db.String(36), db.ForeignKey('quiz_attempts.id'), nullable=False)
     question_id = db.Column(db.String(36), db.ForeignKey('questions.id'), nullable=False)
     selected_option_id = db.Column(db.String(36), db.ForeignKey('question_options.id'))
+    selected_option_ids = db.Column(db.JSON)  # For multiple_select answers
     answer_text = db.Column(db.Text)  # For descriptive/coding answers
-    points_earned = db.Column(db.Integer, default=0)
+    points_earned = db.Column(db.Float, default=0)
     is_correct = db.Column(db.Boolean)
     ai_feedback = db.Column(db.Text)
     answered_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (db.UniqueConstraint('attempt_id', 'question_id', name='unique_attempt_question'),)
+    
     def __repr__(self):
         return f'<StudentAnswer question={self.question_id}>'
 
+class QuestionStatistics(db.Model):
+    """Running item-analysis sufficient statistics per question"""
+    __tablename__ = 'question_statistics'
+    
+    question_id = db.Column(db.String(36), db.ForeignKey('questions.id'), primary_key=True)
+    quiz_id = db.Column(db.String(36), db.ForeignKey('quizzes.id'), nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)  # Sum of attempt percentages
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0)  # Sum of squared attempt percentages
+    correct_score_sum = db.Column(db.Float, nullable=False, default=0)  # Sum of percentages of correct responders
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<QuestionStatistics question={self.question_id}>'
+
+class OptionStatistics(db.Model):
+    """How often each option was picked"""
+    __tablename__ = 'option_statistics'
+    
+    option_id = db.Column(db.String(36), db.ForeignKey('question_options.id'), primary_key=True)
+    question_id = db.Column(db.String(36), db.ForeignKey('questions.id'), nullable=False, index=True)
+    pick_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<OptionStatistics option={self.option_id}>'
+
+class ConceptMastery(db.Model):
+    """Running per-student, per-concept answer counters"""
+    __tablename__ = 'concept_mastery'
+    
+    student_id = db.Column(db.String(36), db.ForeignKey('students.id'), primary_key=True)
+    concept = db.Column(db.String(100), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ConceptMastery student={self.student_id} concept={self.concept}>'
+
 class Assignment(db.Model):
     """Assignment/Homework model"""
     __tablename__ = 'assignments'
@@ -304,6 +370,7 @@ class Submission(db.Model):
     assignment_id = db.Column(db.String(36), db.ForeignKey('assignments.id'), nullable=False)
     student_id = db.Column(db.String(36), db.ForeignKey('students.id'), nullable=False)
     file_path = db.Column(db.String(255))
+    file_hash = db.Column(db.String(64), db.ForeignKey('stored_files.sha256'))
     submission_text = db.Column(db.Text)
     status = db.Column(db.String(20), default='draft')  # draft, submitted, graded, returned
     submission_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -313,9 +380,76 @@ class Submission(db.Model):
     graded_by = db.Column(db.String(36), db.ForeignKey('users.id'))
     graded_date = db.Column(db.DateTime)
     
+    __table_args__ = (db.Index('ix_submissions_student_date', 'student_id', 'submission_date'),)
+    
     def __repr__(self):
         return f'<Submission assignment={self.assignment_id} student={self.student_id}>'
 
+class StoredFile(db.Model):
+    """Content-addressed upload, shared by every upload of the same bytes"""
+    __tablename__ = 'stored_files'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    file_path = db.Column(db.String(255), nullable=False)
+    extension = db.Column(db.String(10))
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    extracted_text = db.Column(db.Text)  # Reused by later uploads of the same content
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StoredFile {self.sha256[:12]}>'
+
+class FileAccess(db.Model):
+    """A user who uploaded a stored file; blobs are only served back to users who hold a reference"""
+    __tablename__ = 'file_access'
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('stored_files.sha256'), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True, index=True)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)  # latest upload by this user
+    
+    def __repr__(self):
+        return f'<FileAccess {self.sha256[:12]} user={self.user_id}>'
+
+class AIResult(db.Model):
+    """Cached AI analysis keyed by a hash of method, prompt version and normalised input"""
+    __tablename__ = 'ai_results'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    method = db.Column(db.String(50), nullable=False)
+    result = db.Column(db.JSON, nullable=False)
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<AIResult {self.method} {self.key[:12]}>'
+
+class AnalysisJob(db.Model):
+    """Queued upload analysis, claimed and run by a background worker"""
+    __tablename__ = 'analysis_jobs'
+    __table_args__ = (
+        db.Index('ix_analysis_jobs_status_created', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # essay, code, audio, image, submission
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    file_hash = db.Column(db.String(64), db.ForeignKey('stored_files.sha256'))
+    submission_id = db.Column(db.String(36), db.ForeignKey('submissions.id'))
+    params = db.Column(db.JSON)  # mode, refresh
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.kind} {self.status}>'
+
 class DoubtRoom(db.Model):
     """Temporary doubt/discussion room"""
     __tablename__ = 'doubt_rooms'
@@ -369,10 +503,15 @@ class Performance(db.Model):
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     student_id = db.Column(db.String(36), db.ForeignKey('students.id'), nullable=False)
-    subject = db.Column(db.String(100))
+    subject = db.Column(db.String(100))  # 'overall' for the across-subject row
     quiz_average = db.Column(db.Float)
     assignment_average = db.Column(db.Float)
     overall_score = db.Column(db.Float)
+    # Running sums behind the averages, maintained by app.services.performance
+    quiz_score_sum = db.Column(db.Float, nullable=False, default=0)
+    quiz_count = db.Column(db.Integer, nullable=False, default=0)
+    assignment_score_sum = db.Column(db.Float, nullable=False, default=0)
+    assignment_count = db.Column(db.Integer, nullable=False, default=0)
     weak_concepts = db.Column(db.JSON)  # List of weak areas
     strong_concepts = db.Column(db.JSON)  # List of strong areas
     improvement_suggestions = db.Column(db.JSON)
@@ -380,5 +519,26 @@ class Performance(db.Model):
     learning_streak = db.Column(db.Integer, default=0)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (db.UniqueConstraint('student_id', 'subject', name='unique_student_subject_performance'),)
+    
     def __repr__(self):
         return f'<Performance student={self.student_id}>'
+
+class LeaderboardScore(db.Model):
+    """Persisted section leaderboard score per student"""
+    __tablename__ = 'leaderboard_scores'
+    
+    student_id = db.Column(db.String(36), db.ForeignKey('students.id'), primary_key=True)
+    section_id = db.Column(db.String(36), db.ForeignKey('sections.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False, default=0)  # Average completed-quiz percentage
+    quizzes_taken = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_leaderboard_section_score', 'section_id', 'score'),
+        db.Index('ix_leaderboard_section_updated', 'section_id', 'updated_at'),
+        db.Index('ix_leaderboard_updated', 'updated_at'),  # Cross-section incremental sync
+    )
+    
+    def __repr__(self):
+        return f'<LeaderboardScore student={self.student_id} score={self.score}>'
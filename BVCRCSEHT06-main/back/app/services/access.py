@@ -0,0 +1,74 @@
+from app import db
+from app.models import (
+    AnalysisJob, Assignment, Department, FileAccess, Quiz, Section, Student, Submission, Teacher, Year
+)
+from app.utils.upsert import upsert
+from datetime import datetime
+
+SCOPES = ('institution', 'department', 'year', 'section')
+
+def teacher_in_scope(teacher, scope, scope_id):
+    """True when an institution, department, year or section is within the teacher's own.
+
+    A teacher's institution is their department's, and their years are
+    the department's years. Their sections are the department's sections
+    plus any section they set a quiz or assignment for.
+    """
+    if scope == 'institution':
+        return scope_id == db.session.query(Department.institution_id).filter(
+            Department.id == teacher.department_id
+        ).scalar()
+
+    if scope == 'department':
+        return scope_id == teacher.department_id
+
+    if scope == 'year':
+        return db.session.query(Year.id).filter(
+            Year.id == scope_id,
+            Year.department_id == teacher.department_id
+        ).first() is not None
+
+    if scope == 'section':
+        in_department = db.session.query(Section.id).join(Year, Year.id == Section.year_id).filter(
+            Section.id == scope_id,
+            Year.department_id == teacher.department_id
+        ).first()
+        return bool(in_department or db.session.query(Quiz.id).filter(
+            Quiz.section_id == scope_id, Quiz.teacher_id == teacher.id
+        ).first() or db.session.query(Assignment.id).filter(
+            Assignment.section_id == scope_id, Assignment.teacher_id == teacher.id
+        ).first())
+
+    return False
+
+def record_upload(user_id, sha256):
+    """Note that a user uploaded a stored file (caller's transaction)"""
+    upsert(FileAccess.__table__, [{
+        'sha256': sha256,
+        'user_id': user_id,
+        'uploaded_at': datetime.utcnow()
+    }], ['sha256', 'user_id'], overwrite=('uploaded_at',))
+
+def may_read_file(user_id, sha256):
+    """True when the user uploaded the file, owns a job or submission of it, or teaches the submission's assignment.
+
+    Stored files are shared by content hash, so knowing a hash alone
+    must not be enough to read someone else's upload.
+    """
+    checks = (
+        db.session.query(FileAccess.sha256).filter(
+            FileAccess.sha256 == sha256, FileAccess.user_id == user_id
+        ),
+        db.session.query(AnalysisJob.id).filter(
+            AnalysisJob.file_hash == sha256, AnalysisJob.user_id == user_id
+        ),
+        db.session.query(Submission.id).join(Student, Student.id == Submission.student_id).filter(
+            Submission.file_hash == sha256, Student.user_id == user_id
+        ),
+        db.session.query(Submission.id).join(
+            Assignment, Assignment.id == Submission.assignment_id
+        ).join(Teacher, Teacher.id == Assignment.teacher_id).filter(
+            Submission.file_hash == sha256, Teacher.user_id == user_id
+        )
+    )
+    return any(query.first() is not None for query in checks)
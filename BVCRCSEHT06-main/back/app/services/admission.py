@@ -0,0 +1,64 @@
+import threading
+import time
+
+class TokenBucket:
+    """Token-bucket admission queue.
+
+    Callers reserve a token and wait for it instead of being refused, so a
+    burst is spread out at `rate` admissions per second after the first
+    `burst`. A caller whose wait would exceed `max_wait` is refused with the
+    suggested retry delay and does not consume a token.
+    """
+
+    def __init__(self, rate=20.0, burst=40, max_wait=10.0):
+        """Initialize bucket"""
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_wait = float(max_wait)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Reserve a token, returns (admitted, wait_seconds)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            # Tokens go negative while callers are queued; the deficit is the queue length
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > self.max_wait:
+                return False, wait
+
+            self._tokens -= 1
+            return True, wait
+
+    def acquire(self):
+        """Block until admitted, returns (admitted, retry_after_seconds)"""
+        admitted, wait = self.reserve()
+        if not admitted:
+            return False, wait
+        if wait:
+            time.sleep(wait)
+        return True, 0.0
+
+class AdmissionControl:
+    """Per-worker admission queue configured from app config"""
+
+    def __init__(self):
+        """Initialize admission control"""
+        self.exam_start = TokenBucket()
+
+    def init_app(self, app):
+        """Build buckets from config"""
+        self.exam_start = TokenBucket(
+            rate=app.config.get('EXAM_START_RATE', 20),
+            burst=app.config.get('EXAM_START_BURST', 40),
+            max_wait=app.config.get('EXAM_START_MAX_WAIT', 10)
+        )
+
+admission = AdmissionControl()
@@ -0,0 +1,180 @@
+from functools import wraps
+from sqlalchemy import select, update, delete, func
+from app import db
+from app.models import AIResult
+from app.utils.upsert import dialect_insert
+from datetime import datetime, timedelta
+import hashlib
+import json
+import re
+import threading
+
+def normalize_text(text):
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+def normalize_code(code):
+    """Unify line endings and trailing whitespace, keeping indentation"""
+    lines = (code or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+def file_digest(path):
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def bypass_requested(args):
+    """True when a request asks for a fresh analysis (?refresh=1)"""
+    return str(args.get('refresh', '')).lower() in ('1', 'true', 'yes')
+
+class AIResultCache:
+    """Persistent cache of AI analyses in the ai_results table.
+
+    Entries are keyed by a SHA-256 of the method, prompt version, model
+    and normalised input, expire after a TTL and are evicted least
+    recently used first beyond a size limit. Reads and writes use their
+    own short transactions so they never commit or roll back the
+    caller's session.
+    """
+
+    # Evict after this many writes from a worker
+    EVICT_EVERY = 100
+
+    def __init__(self):
+        """Initialize cache"""
+        self.enabled = True
+        self.ttl = timedelta(days=30)
+        self.max_entries = 50000
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read settings from app config"""
+        self.enabled = app.config.get('AI_CACHE_ENABLED', self.enabled)
+        self.ttl = timedelta(seconds=app.config.get('AI_CACHE_TTL', int(self.ttl.total_seconds())))
+        self.max_entries = app.config.get('AI_CACHE_MAX_ENTRIES', self.max_entries)
+
+    @staticmethod
+    def key(*parts):
+        """Stable hash of the key parts"""
+        raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Cached result or None, refreshing its LRU position"""
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                select(AIResult.result).where(
+                    AIResult.key == key,
+                    AIResult.created_at >= now - self.ttl
+                )
+            ).scalar()
+            if result is not None:
+                conn.execute(
+                    update(AIResult).where(AIResult.key == key).values(
+                        last_used_at=now, hit_count=AIResult.hit_count + 1
+                    )
+                )
+        return result
+
+    def set(self, key, method, result):
+        """Store or replace a result"""
+        now = datetime.utcnow()
+        stmt = dialect_insert(AIResult.__table__)
+        stmt = stmt.values(
+            key=key, method=method, result=result, hit_count=0, created_at=now, last_used_at=now
+        ).on_conflict_do_update(
+            index_elements=['key'],
+            set_={'result': stmt.excluded.result, 'created_at': now, 'last_used_at': now}
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete expired entries and the least recently used ones beyond max_entries"""
+        with db.engine.begin() as conn:
+            removed = conn.execute(
+                delete(AIResult).where(AIResult.created_at < datetime.utcnow() - self.ttl)
+            ).rowcount
+
+            excess = conn.execute(select(func.count(AIResult.key))).scalar() - self.max_entries
+            if excess > 0:
+                oldest = select(AIResult.key).order_by(AIResult.last_used_at).limit(excess)
+                removed += conn.execute(
+                    delete(AIResult).where(AIResult.key.in_(oldest.scalar_subquery()))
+                ).rowcount
+        return removed
+
+    def fetch(self, method, parts, compute, bypass=False):
+        """Return the cached result for (method, parts) or compute and store it.
+
+        With bypass the AI is always called and the fresh result replaces
+        the cached one. Error results are never cached.
+        """
+        if not self.enabled:
+            return compute()
+
+        key = self.key(method, *parts)
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+        else:
+            cached = self.get(key)
+            with self._lock:
+                if cached is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if cached is not None:
+                return cached
+
+        result = compute()
+        if isinstance(result, dict) and 'error' not in result:
+            self.set(key, method, result)
+        return result
+
+    def stats(self):
+        """Get hit/miss counters for this worker and the table size"""
+        entries = db.session.query(func.count(AIResult.key)).scalar()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': int(self.ttl.total_seconds()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': self.hits / lookups if lookups else 0
+            }
+
+ai_cache = AIResultCache()
+
+def cached_analysis(method, key_parts):
+    """Decorator caching an AIAnalysisService method.
+
+    key_parts receives the method's arguments and returns the normalised
+    values that determine its output. The prompt version and model are
+    added from the service instance.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            parts = (self.PROMPT_VERSION, self.MODEL_NAME) + tuple(key_parts(*args, **kwargs))
+            return ai_cache.fetch(method, parts, lambda: fn(self, *args, **kwargs), bypass=not self.use_cache)
+        return wrapper
+    return decorator
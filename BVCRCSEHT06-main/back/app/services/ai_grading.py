@@ -0,0 +1,249 @@
+from app import db
+from app.models import Question, QuizAttempt, StudentAnswer
+from app.services import concepts, item_analysis
+from app.services.ai_service import AIAnalysisService
+from app.services.completion import attempt_completed
+from app.services.quiz_cache import quiz_cache
+from app.services.response_cache import bump_after_commit
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, update
+from datetime import datetime, timedelta
+import atexit
+import threading
+
+SUBJECTIVE_TYPES = ('descriptive', 'coding')
+
+# An AI-graded answer counts as correct once it earns this share of the points
+PASS_FRACTION = 0.5
+
+class GradingError(ValueError):
+    """The AI reply had no usable score; the answer stays pending and is retried"""
+
+class AIGradingQueue:
+    """Background grading of descriptive and coding answers.
+
+    Submitted attempts are enqueued after commit; each pending answer is
+    sent to the AI service on a bounded thread pool. When an attempt has
+    no pending answers left its total is recomputed and it moves from
+    'submitted' to 'completed'. A failed grading (API error or a reply
+    without a numeric score) is retried with exponential backoff up to
+    max_tries. Every sweep_seconds each worker re-enqueues attempts that
+    have been waiting longer than that, so answers whose retries ran out
+    or were lost in a restart are picked up again without running
+    `flask regrade-pending` by hand. Grading an answer is a conditional
+    UPDATE, so an answer queued twice is only counted once.
+    """
+
+    def __init__(self, max_workers=4):
+        """Initialize queue"""
+        self.max_workers = max_workers
+        self.max_tries = 3
+        self.retry_seconds = 30
+        self.sweep_seconds = 300
+        self._app = None
+        self._executor = None
+        self._scheduler = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Create the worker pool"""
+        self._app = app
+        self.max_workers = app.config.get('AI_GRADING_CONCURRENCY', self.max_workers)
+        self.max_tries = app.config.get('AI_GRADING_MAX_TRIES', self.max_tries)
+        self.retry_seconds = app.config.get('AI_GRADING_RETRY_SECONDS', self.retry_seconds)
+        self.sweep_seconds = app.config.get('AI_GRADING_SWEEP_SECONDS', self.sweep_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-grading')
+
+        if self.sweep_seconds and not app.testing and self._scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            self._scheduler = BackgroundScheduler(daemon=True)
+            self._scheduler.add_job(self._sweep_in_context, 'interval', seconds=self.sweep_seconds,
+                                    max_instances=1, coalesce=True)
+            self._scheduler.start()
+            atexit.register(self.shutdown, wait=False)
+
+    def enqueue_attempt(self, attempt_id):
+        """Schedule grading of every pending subjective answer of an attempt not already queued here"""
+        answer_ids = [answer_id for (answer_id,) in db.session.query(StudentAnswer.id).join(
+            Question, Question.id == StudentAnswer.question_id
+        ).filter(
+            StudentAnswer.attempt_id == attempt_id,
+            StudentAnswer.is_correct.is_(None),
+            Question.question_type.in_(SUBJECTIVE_TYPES)
+        )]
+
+        with self._lock:
+            answer_ids = [answer_id for answer_id in answer_ids if answer_id not in self._inflight]
+            self._inflight.update(answer_ids)
+
+        for answer_id in answer_ids:
+            self._executor.submit(self._run, answer_id)
+        return len(answer_ids)
+
+    def _run(self, answer_id, tries=1):
+        retrying = False
+        with self._app.app_context():
+            try:
+                attempt_id = self.grade_answer(answer_id)
+                if attempt_id:
+                    self.finalize_attempt(attempt_id)
+            except Exception as e:
+                db.session.rollback()
+                if tries < self.max_tries:
+                    delay = self.retry_seconds * 2 ** (tries - 1)
+                    self._app.logger.warning(
+                        f'AI grading failed for answer {answer_id} (try {tries}), retrying in {delay}s: {str(e)}'
+                    )
+                    self._retry_later(answer_id, tries + 1, delay)
+                    retrying = True
+                else:
+                    self._app.logger.error(f'AI grading failed for answer {answer_id}: {str(e)}')
+            finally:
+                db.session.remove()
+                if not retrying:
+                    with self._lock:
+                        self._inflight.discard(answer_id)
+
+    def _retry_later(self, answer_id, tries, delay):
+        timer = threading.Timer(delay, self._executor.submit, (self._run, answer_id, tries))
+        timer.daemon = True
+        timer.start()
+
+    def grade_answer(self, answer_id):
+        """Grade one answer, returns its attempt id once graded or None if there was nothing to grade.
+
+        Raises GradingError when the reply has no numeric score, so the
+        answer is retried rather than left pending without notice. The
+        grade is written with UPDATE ... WHERE is_correct IS NULL; if
+        another worker graded the answer first nothing is written or
+        counted and None is returned.
+        """
+        answer = StudentAnswer.query.get(answer_id)
+        if not answer or answer.is_correct is not None:
+            return None
+
+        question = answer.question
+        max_points = question.points or 0
+
+        if not (answer.answer_text or '').strip():
+            score, feedback = 0, 'No answer given.'
+        else:
+            result = AIAnalysisService().grade_answer(
+                question.question_text, answer.answer_text, max_points, question.question_type
+            )
+            try:
+                score = min(max(float(result['score']), 0), max_points)
+            except (KeyError, TypeError, ValueError):
+                raise GradingError(f'No numeric score in AI reply: {str(result)[:200]}')
+            feedback = result.get('feedback')
+
+        attempt_id, student_id = answer.attempt_id, answer.attempt.student_id
+        is_correct = max_points > 0 and score >= max_points * PASS_FRACTION
+        result = db.session.execute(
+            update(StudentAnswer).where(
+                StudentAnswer.id == answer_id,
+                StudentAnswer.is_correct.is_(None)
+            ).values(
+                points_earned=round(score, 2),
+                is_correct=is_correct,
+                ai_feedback=feedback if isinstance(feedback, str) else str(feedback)
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return None
+
+        concepts.record_answer(student_id, question.concepts, is_correct)
+        bump_after_commit(('student', student_id))
+        db.session.commit()
+        return attempt_id
+
+    def finalize_attempt(self, attempt_id):
+        """Recompute the total and complete the attempt once nothing is pending.
+
+        The status change is a conditional UPDATE so only one worker
+        completes an attempt even if several finish at the same time.
+        """
+        pending = db.session.query(func.count(StudentAnswer.id)).join(
+            Question, Question.id == StudentAnswer.question_id
+        ).filter(
+            StudentAnswer.attempt_id == attempt_id,
+            StudentAnswer.is_correct.is_(None),
+            Question.question_type.in_(SUBJECTIVE_TYPES)
+        ).scalar()
+        if pending:
+            return False
+
+        attempt = QuizAttempt.query.get(attempt_id)
+        score = db.session.query(func.coalesce(func.sum(StudentAnswer.points_earned), 0)).filter(
+            StudentAnswer.attempt_id == attempt_id
+        ).scalar()
+        total_points = attempt.total_points or 0
+        percentage = (score / total_points * 100) if total_points > 0 else 0
+
+        result = db.session.execute(
+            update(QuizAttempt).where(
+                QuizAttempt.id == attempt_id,
+                QuizAttempt.status == 'submitted'
+            ).values(
+                status='completed',
+                score=score,
+                percentage=percentage
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return False
+
+        # Item statistics only count completed attempts, with their final percentage
+        db.session.refresh(attempt)
+        answers = db.session.query(
+            StudentAnswer.question_id,
+            StudentAnswer.is_correct,
+            StudentAnswer.selected_option_ids
+        ).filter(StudentAnswer.attempt_id == attempt_id)
+        item_analysis.record_attempt(attempt, quiz_cache.get_answer_key(attempt.quiz_id), [
+            {'question_id': question_id, 'is_correct': is_correct, 'selected_option_ids': option_ids}
+            for question_id, is_correct, option_ids in answers
+        ])
+        attempt_completed(attempt.student_id, attempt.quiz_id, percentage)
+        db.session.commit()
+        return True
+
+    def enqueue_pending(self, older_than=None):
+        """Re-enqueue every attempt still waiting for AI grading, or only those submitted over older_than seconds ago"""
+        query = db.session.query(QuizAttempt.id).filter(QuizAttempt.status == 'submitted')
+        if older_than:
+            query = query.filter(QuizAttempt.completed_at <= datetime.utcnow() - timedelta(seconds=older_than))
+        attempt_ids = [attempt_id for (attempt_id,) in query]
+        queued = 0
+        for attempt_id in attempt_ids:
+            count = self.enqueue_attempt(attempt_id)
+            if not count:
+                self.finalize_attempt(attempt_id)
+            queued += count
+        return queued
+
+    def _sweep_in_context(self):
+        with self._app.app_context():
+            try:
+                queued = self.enqueue_pending(older_than=self.sweep_seconds)
+                if queued:
+                    self._app.logger.info(f'AI grading sweep re-enqueued {queued} answers')
+            except Exception as e:
+                db.session.rollback()
+                self._app.logger.error(f'AI grading sweep failed: {str(e)}')
+            finally:
+                db.session.remove()
+
+    def shutdown(self, wait=True):
+        """Stop sweeping and wait for queued grading to finish"""
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+ai_grading_queue = AIGradingQueue()
@@ -1,16 +1,34 @@
 import google.generativeai as genai
 from flask import current_app
+from app.services.ai_cache import cached_analysis, normalize_text, normalize_code, file_digest
 import json
+import re
+
+# ```json ... ``` fence the model sometimes wraps JSON replies in
+JSON_FENCE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.DOTALL)
+
+def parse_json_reply(text):
+    """Parse a JSON model reply, tolerating a surrounding code fence; raises ValueError"""
+    match = JSON_FENCE.match(text or '')
+    return json.loads(match.group(1) if match else text)
 
 class AIAnalysisService:
     """Service for AI-powered analysis using Gemini API"""
     
-    def __init__(self):
-        """Initialize Gemini API"""
+    MODEL_NAME = 'gemini-2.0-flash'
+    
+    # Bump when a cached method's prompt changes so old results are not reused
+    PROMPT_VERSION = '1'
+    
+    def __init__(self, use_cache=True):
+        """Initialize Gemini API; use_cache=False forces fresh analyses"""
         api_key = current_app.config.get('GEMINI_API_KEY')
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.use_cache = use_cache
     
+    @cached_analysis('essay', lambda essay_text, student_name='Student', mode='student': (
+        mode, normalize_text(student_name), normalize_text(essay_text)))
     def analyze_essay(self, essay_text, student_name='Student', mode='student'):
         """Analyze essay with feedback"""
         if mode == 'student':
@@ -69,6 +87,7 @@ Format as JSON with keys: summary, strengths, improvements, grade_explanation, p
         except Exception as e:
             return {'error': str(e)}
     
+    @cached_analysis('code', lambda code_text: (normalize_code(code_text),))
     def analyze_code(self, code_text):
         """Analyze code for bugs and improvements"""
         prompt = f"""Analyze this Python code for errors, bugs, and improvements:
@@ -125,6 +144,8 @@ Format as JSON with keys: clarity, grammar, pronunciation, effectiveness, sugges
         except Exception as e:
             return {'error': str(e)}
     
+    @cached_analysis('image', lambda image_path, extracted_text='': (
+        file_digest(image_path), normalize_text(extracted_text)))
     def analyze_image(self, image_path, extracted_text=''):
         """Analyze image content"""
         try:
@@ -151,6 +172,8 @@ Format as JSON with keys: description, concepts, misconceptions, educational_val
         except Exception as e:
             return {'error': str(e)}
     
+    @cached_analysis('word_definition', lambda word, context='': (
+        normalize_text(word).lower(), normalize_text(context)))
     def get_word_definition(self, word, context=''):
         """Get word definition with pronunciation and examples"""
         prompt = f"""Define the word "{word}". {"Context: " + context if context else ""}
@@ -175,6 +198,34 @@ Format as JSON with keys: definition, part_of_speech, pronunciation, examples, s
         except Exception as e:
             return {'error': str(e)}
     
+    def grade_answer(self, question_text, answer_text, max_points, question_type='descriptive'):
+        """Score a descriptive or coding quiz answer"""
+        answer_block = f"```python\n{answer_text}\n```" if question_type == 'coding' else answer_text
+        prompt = f"""Grade this student's answer to a {question_type} quiz question worth {max_points} points.
+
+Question: {question_text}
+
+Answer:
+{answer_block}
+
+Provide:
+1. Score from 0 to {max_points}
+2. Short feedback explaining the score and how to improve
+
+Format as JSON with keys: score, feedback"""
+        
+        try:
+            response = self.model.generate_content(
+                prompt, generation_config={'response_mime_type': 'application/json'}
+            )
+            try:
+                result = parse_json_reply(response.text)
+            except ValueError:
+                result = {'raw_feedback': response.text}
+            return result
+        except Exception as e:
+            return {'error': str(e)}
+    
     def generate_lesson_plan(self, topic, level='beginner'):
         """Generate lesson plan"""
         prompt = f"""Create a detailed lesson plan for teaching "{topic}" at {level} level:
@@ -0,0 +1,316 @@
+from app import db
+from app.models import AnalysisJob, StoredFile, Submission, User
+from app.services.ai_service import AIAnalysisService
+from app.services.file_processor import FileProcessor
+from app.services.blob_store import blob_store
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
+from datetime import datetime, timedelta
+import atexit
+import threading
+import time
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+def read_text_file(filepath):
+    """Read an uploaded text file"""
+    with open(filepath, 'r') as f:
+        return f.read()
+
+def _extract(blob, extractor):
+    """Blob text via the blob store, committed straight away.
+
+    Storing extracted_text makes the session dirty; left uncommitted, the
+    next query autoflushes and holds SQLite's write lock through the AI
+    call, and the AI cache's own connection then fails with "database is
+    locked".
+    """
+    text = blob_store.text(blob, extractor)
+    db.session.commit()
+    return text
+
+def _analyze_essay(job, blob, service):
+    user = User.query.get(job.user_id)
+    essay_text = _extract(blob, FileProcessor().extract_text)
+    analysis = service.analyze_essay(essay_text, user.first_name, job.params.get('mode', 'student'))
+    return {'analysis': analysis, 'file_path': blob.file_path}
+
+def _analyze_code(job, blob, service):
+    code_text = _extract(blob, read_text_file)
+    return {'analysis': service.analyze_code(code_text), 'file_path': blob.file_path}
+
+def _analyze_audio(job, blob, service):
+    transcription = _extract(blob, FileProcessor().speech_to_text)
+    return {
+        'transcription': transcription,
+        'analysis': service.analyze_audio(transcription, blob.file_path),
+        'file_path': blob.file_path
+    }
+
+def _analyze_image(job, blob, service):
+    text_extracted = _extract(blob, FileProcessor().ocr_image)
+    return {
+        'extracted_text': text_extracted,
+        'analysis': service.analyze_image(blob.file_path, text_extracted),
+        'file_path': blob.file_path
+    }
+
+def _analyze_submission(job, blob, service):
+    submission = Submission.query.get(job.submission_id)
+    if blob:
+        content = _extract(blob, FileProcessor().extract_text)
+    else:
+        content = submission.submission_text
+    feedback = service.analyze_essay(content, 'Assignment')
+    submission.ai_feedback = str(feedback)
+    return {'submission_id': submission.id, 'analysis': feedback}
+
+# kind -> fn(job, blob, service) returning the job result
+PROCESSORS = {
+    'essay': _analyze_essay,
+    'code': _analyze_code,
+    'audio': _analyze_audio,
+    'image': _analyze_image,
+    'submission': _analyze_submission
+}
+
+class AnalysisJobQueue:
+    """Database-backed queue for upload analysis.
+
+    Upload endpoints store the file and an analysis_jobs row and return
+    straight away. Jobs run on a bounded thread pool: the worker that
+    created a job starts it after commit, and every worker polls the
+    table so jobs left behind by a restart are still picked up. A job is
+    claimed with a conditional UPDATE from 'queued' to 'running', so it
+    runs once however many workers see it. Jobs stuck in 'running' past
+    the timeout are requeued until they run out of attempts.
+    """
+
+    def __init__(self, max_workers=4):
+        """Initialize queue"""
+        self.max_workers = max_workers
+        self.timeout = 600
+        self.max_attempts = 3
+        self._app = None
+        self._executor = None
+        self._scheduler = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+
+    def init_app(self, app):
+        """Create the worker pool and start polling the table"""
+        self._app = app
+        self.max_workers = app.config.get('ANALYSIS_JOB_WORKERS', self.max_workers)
+        self.timeout = app.config.get('ANALYSIS_JOB_TIMEOUT', self.timeout)
+        self.max_attempts = app.config.get('ANALYSIS_JOB_MAX_ATTEMPTS', self.max_attempts)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+        interval = app.config.get('ANALYSIS_JOB_POLL_SECONDS', 0)
+
+        if interval and not app.testing and self._scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            self._scheduler = BackgroundScheduler(daemon=True)
+            self._scheduler.add_job(self._poll_in_context, 'interval', seconds=interval,
+                                    max_instances=1, coalesce=True)
+            self._scheduler.start()
+            atexit.register(self.shutdown, wait=False)
+
+    def create(self, user_id, kind, blob=None, submission_id=None, **params):
+        """Add a queued job to the caller's transaction; call start() after commit"""
+        if kind not in PROCESSORS:
+            raise ValueError(f'Unknown analysis job: {kind}')
+        job = AnalysisJob(
+            user_id=user_id,
+            kind=kind,
+            status='queued',
+            file_hash=blob.sha256 if blob else None,
+            submission_id=submission_id,
+            params=params
+        )
+        db.session.add(job)
+        return job
+
+    def start(self, job_id):
+        """Hand a committed job to this worker's pool"""
+        with self._lock:
+            if job_id in self._inflight:
+                return False
+            self._inflight.add(job_id)
+        self._executor.submit(self._run, job_id)
+        return True
+
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(AnalysisJob).where(
+                AnalysisJob.id == job_id,
+                AnalysisJob.status == 'queued'
+            ).values(
+                status='running',
+                started_at=now,
+                attempts=AnalysisJob.attempts + 1
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _run(self, job_id):
+        with self._app.app_context():
+            try:
+                if self._claim(job_id):
+                    self.process(job_id)
+            except Exception as e:
+                db.session.rollback()
+                self._app.logger.error(f'Analysis job {job_id} failed: {str(e)}')
+                self._finish(job_id, 'failed', error=str(e))
+            finally:
+                db.session.remove()
+                with self._finished:
+                    self._inflight.discard(job_id)
+                    self._finished.notify_all()
+
+    def process(self, job_id):
+        """Run a claimed job and store its result"""
+        job = AnalysisJob.query.get(job_id)
+        blob = db.session.get(StoredFile, job.file_hash) if job.file_hash else None
+        service = AIAnalysisService(use_cache=not (job.params or {}).get('refresh'))
+
+        result = PROCESSORS[job.kind](job, blob, service)
+        analysis = result.get('analysis')
+        if isinstance(analysis, dict) and 'error' in analysis:
+            # Keep extracted text and submission changes, report the AI failure
+            db.session.commit()
+            self._finish(job_id, 'failed', result=result, error=str(analysis['error']))
+            return
+
+        job.status = 'succeeded'
+        job.result = result
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        db.session.execute(
+            update(AnalysisJob).where(AnalysisJob.id == job_id).values(
+                status=status,
+                result=result,
+                error=error,
+                finished_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def _poll_in_context(self):
+        with self._app.app_context():
+            try:
+                self.poll()
+            except Exception as e:
+                db.session.rollback()
+                self._app.logger.error(f'Analysis job poll failed: {str(e)}')
+            finally:
+                db.session.remove()
+
+    def poll(self):
+        """Requeue stalled jobs and start queued ones while this worker has free slots"""
+        self.requeue_stalled()
+
+        with self._lock:
+            free = self.max_workers - len(self._inflight)
+            skip = list(self._inflight)
+        if free <= 0:
+            return 0
+
+        query = db.session.query(AnalysisJob.id).filter(AnalysisJob.status == 'queued')
+        if skip:
+            query = query.filter(AnalysisJob.id.notin_(skip))
+        job_ids = [job_id for (job_id,) in query.order_by(AnalysisJob.created_at).limit(free)]
+        db.session.commit()
+
+        return sum(1 for job_id in job_ids if self.start(job_id))
+
+    def requeue_stalled(self):
+        """Put jobs whose worker died back in the queue, or fail them after max_attempts"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.timeout)
+        stalled = (AnalysisJob.status == 'running', AnalysisJob.started_at < cutoff)
+
+        requeued = db.session.execute(
+            update(AnalysisJob).where(*stalled, AnalysisJob.attempts < self.max_attempts).values(
+                status='queued'
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.execute(
+            update(AnalysisJob).where(*stalled).values(
+                status='failed',
+                error='Timed out',
+                finished_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return requeued
+
+    def wait(self, job_id, timeout):
+        """Reload a job until it finishes or timeout seconds pass (long polling).
+
+        Jobs finishing in this worker wake the waiter at once; jobs run by
+        another worker are seen on the next re-read, at most a second later.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            db.session.expire_all()
+            job = AnalysisJob.query.get(job_id)
+            remaining = deadline - time.monotonic()
+            if not job or job.status in TERMINAL_STATUSES or remaining <= 0:
+                return job
+            db.session.commit()
+            with self._finished:
+                self._finished.wait(min(remaining, 1))
+
+    def prune(self, max_age_seconds):
+        """Delete finished jobs older than max_age_seconds, returns how many were removed.
+
+        The upload reference an analysis job owns is released with it, so
+        prune-blobs can reclaim the file; submission jobs don't own one,
+        their Submission does.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+        jobs = db.session.query(AnalysisJob.id, AnalysisJob.file_hash, AnalysisJob.submission_id).filter(
+            AnalysisJob.status.in_(TERMINAL_STATUSES),
+            AnalysisJob.finished_at < cutoff
+        ).all()
+        if not jobs:
+            return 0
+
+        released = Counter(file_hash for _, file_hash, submission_id in jobs if file_hash and not submission_id)
+        for file_hash, count in released.items():
+            blob_store.release(file_hash, count)
+
+        job_ids = [job_id for job_id, _, _ in jobs]
+        for start in range(0, len(job_ids), 500):
+            AnalysisJob.query.filter(AnalysisJob.id.in_(job_ids[start:start + 500])).delete(
+                synchronize_session=False
+            )
+        db.session.commit()
+        return len(job_ids)
+
+    def stats(self):
+        """Job counts by status and this worker's pool usage"""
+        counts = dict(db.session.query(AnalysisJob.status, db.func.count(AnalysisJob.id)).group_by(
+            AnalysisJob.status
+        ).all())
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'running_here': len(self._inflight),
+                'jobs': counts
+            }
+
+    def shutdown(self, wait=True):
+        """Stop polling and wait for running jobs"""
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+analysis_jobs = AnalysisJobQueue()
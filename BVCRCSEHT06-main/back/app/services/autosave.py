@@ -0,0 +1,45 @@
+from app import db
+from app.models import QuizAttempt, StudentAnswer
+from app.services.grading import UPSERT_COLUMNS
+from app.utils.upsert import dialect_insert
+from sqlalchemy import select, literal
+from datetime import datetime
+import uuid
+
+def save_answer(attempt_id, question_id, option_ids=None, text=None):
+    """Upsert one autosaved answer if its attempt is still in progress.
+
+    The status check is part of the write itself (INSERT ... SELECT FROM
+    quiz_attempts WHERE status = 'in_progress' ... ON CONFLICT DO UPDATE),
+    and on PostgreSQL the attempt row is share-locked, so a save can
+    never land on an attempt a concurrent submit has already claimed and
+    graded. The answer is in the database before the save is
+    acknowledged, so submit, on whichever worker, grades exactly what was
+    saved. Returns False when the attempt is no longer in progress; the
+    caller commits.
+    """
+    option_ids = sorted(option_ids) if option_ids else None
+    values = {
+        'id': str(uuid.uuid4()),
+        'attempt_id': attempt_id,
+        'question_id': question_id,
+        'selected_option_id': option_ids[0] if option_ids and len(option_ids) == 1 else None,
+        'selected_option_ids': option_ids,
+        'answer_text': text,
+        'points_earned': 0,
+        'is_correct': None,
+        'answered_at': datetime.utcnow()
+    }
+    table = StudentAnswer.__table__
+
+    source = select(*[literal(value, table.c[name].type).label(name) for name, value in values.items()]).where(
+        QuizAttempt.id == attempt_id,
+        QuizAttempt.status == 'in_progress'
+    ).with_for_update(read=True)
+
+    stmt = dialect_insert(table).from_select(list(values), source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['attempt_id', 'question_id'],
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+    )
+    return db.session.execute(stmt).rowcount == 1
@@ -0,0 +1,174 @@
+from werkzeug.utils import secure_filename
+from sqlalchemy import update, delete, event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import StoredFile, FileAccess
+from app.utils.upsert import upsert
+from datetime import datetime, timedelta
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+# Session.info key of [(temp_path, file_path)] moved into place once the transaction commits
+PENDING_KEY = 'blob_store_pending_moves'
+
+class BlobStore:
+    """Content-addressed store for uploaded files.
+
+    Files live at UPLOAD_FOLDER/blobs/ab/cd/<sha256><ext>, keyed by the
+    SHA-256 computed while the upload is streamed to a temporary file.
+    A StoredFile row counts references, so identical uploads share one
+    file and reuse the text already extracted from it. Rows and reference
+    counts are written in the caller's transaction, and a new file is only
+    moved into place once that transaction commits, so a rollback never
+    leaves a file without a row.
+    """
+
+    def __init__(self):
+        """Initialize store"""
+        self.root = None
+
+    def init_app(self, app):
+        """Create the blob directory"""
+        self.root = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, sha256, extension=''):
+        """Sharded location of a blob"""
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256 + extension)
+
+    def save(self, file, filename=None, reference=True):
+        """Store an uploaded file (FileStorage or binary stream), taking a reference to it by default"""
+        stream = getattr(file, 'stream', file)
+        filename = filename or getattr(file, 'filename', None) or ''
+        extension = os.path.splitext(secure_filename(filename))[1].lower()[:10]
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return self.commit_temp(temp_path, digest.hexdigest(), size, extension, reference)
+
+    def commit_temp(self, temp_path, sha256, size, extension='', reference=True):
+        """Record a fully written temporary file and take ownership of it.
+
+        The row (and a reference, unless reference=False) is written in
+        the caller's transaction. The file is moved into place after that
+        transaction commits, or deleted if it rolls back or the content
+        is already stored.
+        """
+        try:
+            existing = db.session.get(StoredFile, sha256)
+            file_path = existing.file_path if existing else self.path_for(sha256, extension)
+
+            now = datetime.utcnow()
+            upsert(StoredFile.__table__, [{
+                'sha256': sha256,
+                'file_path': file_path,
+                'extension': extension,
+                'size': size,
+                'ref_count': 1 if reference else 0,
+                'created_at': now,
+                'last_used_at': now
+            }], ['sha256'], overwrite=('last_used_at',), increment=('ref_count',))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            db.session.info.setdefault(PENDING_KEY, []).append((temp_path, file_path))
+
+        return db.session.get(StoredFile, sha256, populate_existing=True)
+
+    @staticmethod
+    def text(blob, extractor):
+        """Text of a blob, extracted once with extractor(file_path) and reused afterwards"""
+        if blob.extracted_text is None:
+            text = extractor(blob.file_path)
+            if text is not None:
+                blob.extracted_text = text
+            return text
+        return blob.extracted_text
+
+    @staticmethod
+    def release(sha256, count=1):
+        """Drop references (caller's transaction); unreferenced blobs are removed by prune()"""
+        if not sha256:
+            return
+        db.session.execute(
+            update(StoredFile).where(StoredFile.sha256 == sha256).values(
+                ref_count=StoredFile.ref_count - count
+            ).execution_options(synchronize_session=False)
+        )
+
+    def prune(self, min_age_seconds=86400):
+        """Delete unreferenced blobs not used for min_age_seconds, returns how many were removed"""
+        cutoff = datetime.utcnow() - timedelta(seconds=min_age_seconds)
+        candidates = db.session.query(StoredFile.sha256, StoredFile.file_path).filter(
+            StoredFile.ref_count <= 0,
+            StoredFile.last_used_at < cutoff
+        ).all()
+
+        removed = 0
+        for sha256, file_path in candidates:
+            db.session.execute(
+                delete(FileAccess).where(FileAccess.sha256 == sha256).execution_options(synchronize_session=False)
+            )
+            # Conditional so a blob re-uploaded meanwhile is kept, with its uploaders
+            result = db.session.execute(
+                delete(StoredFile).where(
+                    StoredFile.sha256 == sha256,
+                    StoredFile.ref_count <= 0,
+                    StoredFile.last_used_at < cutoff
+                ).execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                db.session.rollback()
+                continue
+            db.session.commit()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                removed += 1
+            self._remove_sidecars(sha256)
+        return removed
+
+    def _remove_sidecars(self, sha256):
+        """Delete derived files (e.g. PDF page indexes) stored next to a blob as <sha256>.*"""
+        directory = os.path.dirname(self.path_for(sha256))
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(sha256 + '.'):
+                os.remove(os.path.join(directory, name))
+
+blob_store = BlobStore()
+
+@event.listens_for(Session, 'after_commit')
+def _move_committed(session):
+    for temp_path, file_path in session.info.pop(PENDING_KEY, ()):
+        if os.path.exists(file_path):
+            # Another upload of the same content landed first
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(temp_path, file_path)
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted(session, transaction):
+    # Rolled back or closed without commit: after_commit did not claim the files
+    if transaction.parent is None:
+        for temp_path, _ in session.info.pop(PENDING_KEY, ()):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
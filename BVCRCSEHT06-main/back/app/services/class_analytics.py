@@ -0,0 +1,105 @@
+from app import db
+from app.models import Student, User, Section, Year, QuizAttempt, Submission
+from sqlalchemy import func, select
+
+SCOPES = ('section', 'year', 'department')
+
+def scoped_student_ids(scope, scope_id):
+    """SELECT of the ids of the students in a section, year or department"""
+    query = select(Student.id)
+    if scope == 'section':
+        return query.where(Student.section_id == scope_id)
+    if scope == 'year':
+        return query.join(Section, Section.id == Student.section_id).where(Section.year_id == scope_id)
+    if scope == 'department':
+        return query.join(Section, Section.id == Student.section_id).join(
+            Year, Year.id == Section.year_id
+        ).where(Year.department_id == scope_id)
+    raise ValueError(f'Unknown scope: {scope}')
+
+def student_averages(scope, scope_id):
+    """Per-student quiz and assignment averages for a section, year or department.
+
+    Quiz and submission aggregates are grouped in SQL subqueries and
+    outer-joined to students and users, so the whole report is one query
+    whatever the number of students. Each subquery is restricted to the
+    scoped students, so only their attempts and submissions are grouped.
+    """
+    student_ids = scoped_student_ids(scope, scope_id)
+
+    quiz_stats = db.session.query(
+        QuizAttempt.student_id.label('student_id'),
+        func.avg(QuizAttempt.percentage).label('avg_quiz'),
+        func.count(QuizAttempt.id).label('quizzes_taken')
+    ).filter(
+        QuizAttempt.status == 'completed',
+        QuizAttempt.student_id.in_(student_ids)
+    ).group_by(QuizAttempt.student_id).subquery()
+
+    assignment_stats = db.session.query(
+        Submission.student_id.label('student_id'),
+        func.avg(Submission.grade).label('avg_assignment'),
+        func.count(Submission.id).label('assignments_submitted')
+    ).filter(
+        Submission.student_id.in_(student_ids)
+    ).group_by(Submission.student_id).subquery()
+
+    query = db.session.query(
+        Student.id,
+        Student.roll_number,
+        Student.section_id,
+        Section.name,
+        User.first_name,
+        User.last_name,
+        quiz_stats.c.avg_quiz,
+        quiz_stats.c.quizzes_taken,
+        assignment_stats.c.avg_assignment,
+        assignment_stats.c.assignments_submitted
+    ).join(
+        User, User.id == Student.user_id
+    ).join(
+        Section, Section.id == Student.section_id
+    ).outerjoin(
+        quiz_stats, quiz_stats.c.student_id == Student.id
+    ).outerjoin(
+        assignment_stats, assignment_stats.c.student_id == Student.id
+    ).filter(
+        Student.id.in_(student_ids)
+    )
+
+    students = []
+    for (student_id, roll_number, section_id, section_name, first_name, last_name,
+         avg_quiz, quizzes_taken, avg_assignment, assignments_submitted) in query.order_by(Section.name, Student.roll_number):
+        avg_quiz = avg_quiz or 0
+        avg_assignment = avg_assignment or 0
+        students.append({
+            'student_id': student_id,
+            'student_name': first_name + ' ' + last_name,
+            'roll_number': roll_number,
+            'section_id': section_id,
+            'section': section_name,
+            'avg_quiz_score': avg_quiz,
+            'avg_assignment_score': avg_assignment,
+            'overall_score': (avg_quiz + avg_assignment) / 2,
+            'quizzes_taken': quizzes_taken or 0,
+            'assignments_submitted': assignments_submitted or 0
+        })
+    return students
+
+def summarize(students):
+    """Overall and per-section averages over a student report"""
+    sections = {}
+    for s in students:
+        entry = sections.setdefault(s['section_id'], {'section_id': s['section_id'], 'section': s['section'], 'scores': []})
+        entry['scores'].append(s['overall_score'])
+
+    return {
+        'total_students': len(students),
+        'class_average': sum(s['overall_score'] for s in students) / len(students) if students else 0,
+        'sections': [{
+            'section_id': entry['section_id'],
+            'section': entry['section'],
+            'total_students': len(entry['scores']),
+            'average': sum(entry['scores']) / len(entry['scores'])
+        } for entry in sections.values()]
+    }
@@ -0,0 +1,156 @@
+from app import db
+from app.models import QuizAttempt, Student, Section, Year
+import numpy as np
+import threading
+import time
+
+SCOPES = ('institution', 'department', 'year', 'section')
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Histogram bin edges over the 0-100 percentage range
+BIN_EDGES = np.linspace(0, 100, 11)
+
+def load_scores(scope, scope_id, quiz_id=None):
+    """Completed-attempt percentages and their section ids as arrays, in one query"""
+    query = db.session.query(
+        QuizAttempt.percentage, Student.section_id
+    ).join(
+        Student, Student.id == QuizAttempt.student_id
+    ).filter(
+        QuizAttempt.status == 'completed',
+        QuizAttempt.percentage.isnot(None)
+    )
+
+    if scope == 'institution':
+        query = query.filter(Student.institution_id == scope_id)
+    elif scope == 'section':
+        query = query.filter(Student.section_id == scope_id)
+    elif scope == 'year':
+        query = query.join(Section, Section.id == Student.section_id).filter(Section.year_id == scope_id)
+    elif scope == 'department':
+        query = query.join(Section, Section.id == Student.section_id).join(
+            Year, Year.id == Section.year_id
+        ).filter(Year.department_id == scope_id)
+    else:
+        raise ValueError(f'Unknown scope: {scope}')
+
+    if quiz_id:
+        query = query.filter(QuizAttempt.quiz_id == quiz_id)
+
+    rows = query.all()
+    scores = np.fromiter((percentage for percentage, _ in rows), dtype=float, count=len(rows))
+    sections = np.array([section_id or '' for _, section_id in rows], dtype=object)
+    return scores, sections
+
+def distribution(scores, sections):
+    """Histogram, percentiles and per-section comparison, all vectorized"""
+    if not scores.size:
+        return {'attempts': 0, 'mean': None, 'std': None, 'percentiles': {}, 'histogram': [], 'sections': []}
+
+    mean = scores.mean()
+    std = scores.std()
+    counts, _ = np.histogram(np.clip(scores, 0, 100), bins=BIN_EDGES)
+    quantiles = np.percentile(scores, PERCENTILES)
+
+    # Group by section: sort once, then reduce each run with bincount / split
+    section_ids, inverse = np.unique(sections, return_inverse=True)
+    section_counts = np.bincount(inverse)
+    section_means = np.bincount(inverse, weights=scores) / section_counts
+    order = np.lexsort((scores, inverse))
+    section_medians = [
+        float(np.median(group)) for group in np.split(scores[order], np.cumsum(section_counts)[:-1])
+    ]
+    z_scores = (section_means - mean) / std if std > 0 else np.zeros_like(section_means)
+
+    return {
+        'attempts': int(scores.size),
+        'mean': float(mean),
+        'std': float(std),
+        'percentiles': {f'p{p}': float(q) for p, q in zip(PERCENTILES, quantiles)},
+        'histogram': [{
+            'from': float(BIN_EDGES[i]),
+            'to': float(BIN_EDGES[i + 1]),
+            'count': int(count)
+        } for i, count in enumerate(counts)],
+        'sections': [{
+            'section_id': section_id or None,
+            'attempts': int(section_counts[i]),
+            'mean': float(section_means[i]),
+            'median': section_medians[i],
+            'z_score': float(z_scores[i])
+        } for i, section_id in enumerate(section_ids)]
+    }
+
+def summarize(scope, scope_id, quiz_id=None):
+    """Distribution of a cohort with section names attached"""
+    result = distribution(*load_scores(scope, scope_id, quiz_id))
+    section_ids = [s['section_id'] for s in result['sections'] if s['section_id']]
+    names = dict(db.session.query(Section.id, Section.name).filter(Section.id.in_(section_ids))) if section_ids else {}
+    for s in result['sections']:
+        s['section'] = names.get(s['section_id'])
+    return result
+
+class CohortCache:
+    """Per-worker cache of cohort distributions with time-based expiry.
+
+    Distributions change only as attempts complete, so a short TTL keeps
+    repeated dashboard loads off the database without invalidation.
+    """
+
+    def __init__(self, ttl_seconds=300, max_entries=512):
+        """Initialize cache"""
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Read TTL and size from app config"""
+        self.ttl = app.config.get('COHORT_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('COHORT_CACHE_SIZE', self.max_entries)
+
+    def get(self, scope, scope_id, quiz_id=None):
+        """Get the distribution of a (scope, quiz), computing it on a miss or after expiry"""
+        key = (scope, scope_id, quiz_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = summarize(scope, scope_id, quiz_id)
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the ones closest to expiry
+                for stale in sorted(self._entries, key=lambda k: self._entries[k][0])[:max(1, len(self._entries) // 4)]:
+                    del self._entries[stale]
+            self._entries[key] = (now + self.ttl, result)
+        return result
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Get hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0
+            }
+
+cohort_cache = CohortCache()
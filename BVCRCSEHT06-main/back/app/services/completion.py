@@ -0,0 +1,16 @@
+from app import db
+from app.models import Quiz
+from app.services import performance, concepts
+from app.services.leaderboard import leaderboards
+from app.services.response_cache import bump_after_commit, student_scopes
+
+def attempt_completed(student_id, quiz_id, percentage):
+    """Update derived aggregates when a quiz attempt reaches 'completed'.
+
+    Called exactly once per attempt, inside the transaction that completes it.
+    """
+    subject = db.session.query(Quiz.subject).filter(Quiz.id == quiz_id).scalar()
+    performance.record_quiz_completion(student_id, subject, percentage)
+    concepts.refresh_performance(student_id)
+    leaderboards.record(student_id)
+    bump_after_commit(*student_scopes(student_id), ('quiz', quiz_id))
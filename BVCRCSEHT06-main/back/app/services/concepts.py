@@ -0,0 +1,131 @@
+from flask import current_app
+from app import db
+from app.models import ConceptMastery, Performance, Question, QuizAttempt, StudentAnswer
+from app.services.performance import OVERALL_SUBJECT
+from app.utils.upsert import upsert
+from collections import Counter
+from datetime import datetime
+
+COUNTER_COLUMNS = ('attempts', 'errors')
+
+def normalize(tags):
+    """Clean concept tags from a list or a pipe-separated string into a unique lower-case list"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split('|')
+    concepts = []
+    for tag in tags:
+        tag = str(tag).strip().lower()[:100]
+        if tag and tag not in concepts:
+            concepts.append(tag)
+    return concepts
+
+def _counter_rows(student_id, counts):
+    now = datetime.utcnow()
+    return [{
+        'student_id': student_id,
+        'concept': concept,
+        'attempts': attempts,
+        'errors': errors,
+        'updated_at': now
+    } for concept, (attempts, errors) in counts.items()]
+
+def record_answers(student_id, answer_key, rows):
+    """Count graded answers of one attempt against their concepts (caller's transaction).
+
+    Only answers with a verdict are counted; descriptive and coding answers
+    are counted by record_answer once the AI has graded them.
+    """
+    counts = {}
+    for row in rows:
+        if row['is_correct'] is None:
+            continue
+        for concept in answer_key.questions[row['question_id']]['concepts']:
+            attempts, errors = counts.get(concept, (0, 0))
+            counts[concept] = (attempts + 1, errors + (0 if row['is_correct'] else 1))
+
+    upsert(ConceptMastery.__table__, _counter_rows(student_id, counts), ['student_id', 'concept'],
+           overwrite=('updated_at',), increment=COUNTER_COLUMNS)
+
+def record_answer(student_id, concepts, is_correct):
+    """Count a single graded answer (caller's transaction)"""
+    counts = {concept: (1, 0 if is_correct else 1) for concept in concepts or []}
+    upsert(ConceptMastery.__table__, _counter_rows(student_id, counts), ['student_id', 'concept'],
+           overwrite=('updated_at',), increment=COUNTER_COLUMNS)
+
+def mastery(student_id):
+    """Weak and strong concepts of a student, read straight from the counters"""
+    min_attempts = current_app.config.get('CONCEPT_MIN_ATTEMPTS', 3)
+    weak_rate = current_app.config.get('CONCEPT_WEAK_ERROR_RATE', 0.5)
+    strong_rate = current_app.config.get('CONCEPT_STRONG_ERROR_RATE', 0.2)
+
+    rows = ConceptMastery.query.filter(
+        ConceptMastery.student_id == student_id,
+        ConceptMastery.attempts >= min_attempts
+    ).all()
+
+    concepts = [{
+        'concept': row.concept,
+        'attempts': row.attempts,
+        'error_count': row.errors,
+        'error_rate': row.errors / row.attempts
+    } for row in rows]
+
+    return {
+        'weak': sorted((c for c in concepts if c['error_rate'] >= weak_rate),
+                       key=lambda c: (-c['error_rate'], -c['attempts'])),
+        'strong': sorted((c for c in concepts if c['error_rate'] <= strong_rate),
+                         key=lambda c: (c['error_rate'], -c['attempts']))
+    }
+
+def refresh_performance(student_id):
+    """Copy current weak/strong concept names onto the student's overall Performance row"""
+    result = mastery(student_id)
+    Performance.query.filter_by(student_id=student_id, subject=OVERALL_SUBJECT).update({
+        'weak_concepts': [c['concept'] for c in result['weak']],
+        'strong_concepts': [c['concept'] for c in result['strong']]
+    }, synchronize_session=False)
+
+def rebuild(student_id=None):
+    """Recount every student's concepts from graded answers (backfill)"""
+    query = db.session.query(
+        QuizAttempt.student_id, Question.concepts, StudentAnswer.is_correct
+    ).join(
+        QuizAttempt, QuizAttempt.id == StudentAnswer.attempt_id
+    ).join(
+        Question, Question.id == StudentAnswer.question_id
+    ).filter(
+        QuizAttempt.status.in_(('submitted', 'completed')),
+        StudentAnswer.is_correct.isnot(None)
+    )
+    reset = ConceptMastery.query
+    if student_id:
+        query = query.filter(QuizAttempt.student_id == student_id)
+        reset = reset.filter(ConceptMastery.student_id == student_id)
+
+    attempts = Counter()
+    errors = Counter()
+    for sid, concepts, is_correct in query.yield_per(1000):
+        for concept in concepts or []:
+            attempts[(sid, concept)] += 1
+            if not is_correct:
+                errors[(sid, concept)] += 1
+
+    reset.delete(synchronize_session=False)
+    now = datetime.utcnow()
+    upsert(ConceptMastery.__table__, [{
+        'student_id': sid,
+        'concept': concept,
+        'attempts': count,
+        'errors': errors[(sid, concept)],
+        'updated_at': now
+    } for (sid, concept), count in attempts.items()], ['student_id', 'concept'],
+        overwrite=('updated_at',) + COUNTER_COLUMNS)
+
+    students = db.session.query(Performance.student_id).filter(Performance.subject == OVERALL_SUBJECT)
+    if student_id:
+        students = students.filter(Performance.student_id == student_id)
+    for (sid,) in students.all():
+        refresh_performance(sid)
+    return len(attempts)
@@ -0,0 +1,163 @@
+from app import db
+from app.models import Student, User, Quiz, QuizAttempt, StudentAnswer, Question, Submission, Assignment
+from app.services.access import teacher_in_scope
+from datetime import datetime, date, timedelta
+import csv
+import io
+import json
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def _attempts_query():
+    return db.session.query(
+        QuizAttempt.id.label('attempt_id'),
+        QuizAttempt.quiz_id,
+        Quiz.title.label('quiz_title'),
+        Quiz.subject,
+        QuizAttempt.student_id,
+        Student.roll_number,
+        User.first_name,
+        User.last_name,
+        Student.section_id,
+        QuizAttempt.attempt_number,
+        QuizAttempt.status,
+        QuizAttempt.score,
+        QuizAttempt.total_points,
+        QuizAttempt.percentage,
+        QuizAttempt.started_at,
+        QuizAttempt.completed_at
+    ).join(
+        Quiz, Quiz.id == QuizAttempt.quiz_id
+    ).join(
+        Student, Student.id == QuizAttempt.student_id
+    ).join(
+        User, User.id == Student.user_id
+    ), QuizAttempt.completed_at
+
+def _answers_query():
+    return db.session.query(
+        StudentAnswer.id.label('answer_id'),
+        StudentAnswer.attempt_id,
+        QuizAttempt.quiz_id,
+        QuizAttempt.student_id,
+        Student.roll_number,
+        StudentAnswer.question_id,
+        Question.question_type,
+        StudentAnswer.selected_option_id,
+        StudentAnswer.selected_option_ids,
+        StudentAnswer.answer_text,
+        StudentAnswer.points_earned,
+        StudentAnswer.is_correct,
+        StudentAnswer.answered_at
+    ).join(
+        QuizAttempt, QuizAttempt.id == StudentAnswer.attempt_id
+    ).join(
+        Question, Question.id == StudentAnswer.question_id
+    ).join(
+        Student, Student.id == QuizAttempt.student_id
+    ), StudentAnswer.answered_at
+
+def _submissions_query():
+    return db.session.query(
+        Submission.id.label('submission_id'),
+        Submission.assignment_id,
+        Assignment.title.label('assignment_title'),
+        Assignment.subject,
+        Submission.student_id,
+        Student.roll_number,
+        User.first_name,
+        User.last_name,
+        Student.section_id,
+        Submission.status,
+        Submission.grade,
+        Submission.submission_date,
+        Submission.graded_date
+    ).join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).join(
+        Student, Student.id == Submission.student_id
+    ).join(
+        User, User.id == Student.user_id
+    ), Submission.submission_date
+
+EXPORTS = {
+    'attempts': _attempts_query,
+    'answers': _answers_query,
+    'submissions': _submissions_query
+}
+
+def build_query(kind, institution_id=None, section_id=None, start=None, end=None):
+    """Column query for an export kind, filtered by institution, section and [start, end)"""
+    if kind not in EXPORTS:
+        raise ValueError(f'Unknown export: {kind}')
+
+    query, date_column = EXPORTS[kind]()
+    if institution_id:
+        query = query.filter(Student.institution_id == institution_id)
+    if section_id:
+        query = query.filter(Student.section_id == section_id)
+    if start:
+        query = query.filter(date_column >= start)
+    if end:
+        query = query.filter(date_column < end)
+    return query.order_by(date_column)
+
+def teacher_may_export(teacher, institution_id=None, section_id=None):
+    """True when the requested institution and section are the teacher's own (see access.teacher_in_scope)"""
+    return all(
+        teacher_in_scope(teacher, scope, scope_id)
+        for scope, scope_id in (('institution', institution_id), ('section', section_id))
+        if scope_id
+    )
+
+def parse_range(date_from=None, date_to=None):
+    """Turn inclusive YYYY-MM-DD bounds into a [start, end) datetime range, raises ValueError"""
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise ValueError('from and to must be dates like 2024-01-31')
+    if start:
+        start = datetime.combine(start.date(), datetime.min.time())
+    if end:
+        end = datetime.combine(end.date(), datetime.min.time()) + timedelta(days=1)
+    return start, end
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def stream_rows(query, fmt, batch_size=1000):
+    """Yield the query's rows as CSV or NDJSON text chunks.
+
+    Rows are fetched `batch_size` at a time with a server-side cursor
+    where the driver supports one, and written out once per batch, so
+    memory use does not grow with the size of the export.
+    """
+    columns = [c['name'] for c in query.column_descriptions]
+    result = query.execution_options(yield_per=batch_size)
+    buffer = io.StringIO()
+    writer = None
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+    for i, row in enumerate(result, 1):
+        values = [_value(v) for v in row]
+        if writer:
+            writer.writerow(['|'.join(v) if isinstance(v, list) else v for v in values])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))) + '\n')
+
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -1,12 +1,10 @@
 import os
-import PyPDF2
 import docx
-from PIL import Image
-import pytesseract
 import librosa
 import speech_recognition as sr
 import pyttsx3
 from flask import current_app
+from app.services import pdf_pages, ocr
 
 class FileProcessor:
     """File processing and extraction service"""
@@ -14,6 +12,22 @@ class FileProcessor:
     def __init__(self):
         """Initialize file processor"""
         self.upload_folder = current_app.config['UPLOAD_FOLDER']
+        self.pdf_processes = current_app.config.get('PDF_EXTRACT_PROCESSES', 0)
+        self.pdf_pages_per_task = current_app.config.get('PDF_PAGES_PER_TASK', 25)
+        self.pdf_parallel_min_pages = current_app.config.get('PDF_PARALLEL_MIN_PAGES', 100)
+        self.ocr_scanned_pdfs = current_app.config.get('OCR_SCANNED_PDFS', True)
+        self.ocr_settings = {
+            'lang': current_app.config.get('OCR_LANG', 'eng'),
+            'target_dpi': current_app.config.get('OCR_TARGET_DPI', 300),
+            'max_side': current_app.config.get('OCR_MAX_SIDE', 4000),
+            'tile_min_height': current_app.config.get('OCR_TILE_MIN_HEIGHT', 3000),
+            'min_page_chars': current_app.config.get('OCR_MIN_PAGE_CHARS', 20),
+            'cache_dir': os.path.join(self.upload_folder, 'ocr')
+        }
+    
+    def _pool(self):
+        """Shared process pool, or None when running single-process"""
+        return pdf_pages.get_pool(self.pdf_processes) if self.pdf_processes > 1 else None
     
     def extract_text(self, file_path):
         """Extract text from various file types"""
@@ -30,39 +44,63 @@ class FileProcessor:
         else:
             return None
     
+    def iter_pdf_pages(self, pdf_path, page_start=1, page_end=None, use_ocr=None):
+        """Yield (page_number, text) for 1-based pages page_start..page_end, large ranges in parallel.
+        
+        Scanned pages (no text layer) are OCR'd from their page images
+        when use_ocr is true (default: OCR_SCANNED_PDFS).
+        """
+        pages = pdf_pages.iter_pages(
+            pdf_path,
+            page_start - 1,
+            page_end,
+            processes=self.pdf_processes,
+            pages_per_task=self.pdf_pages_per_task,
+            parallel_min_pages=self.pdf_parallel_min_pages
+        )
+        if not (self.ocr_scanned_pdfs if use_ocr is None else use_ocr):
+            return pages
+        return ocr.fill_scanned_pages(
+            pdf_path, pages, self.ocr_settings, self._pool(), window=max(self.pdf_processes, 1) * 2
+        )
+    
+    def needs_ocr(self, text):
+        """True for page text too short to be a real text layer"""
+        return ocr.needs_ocr(text, self.ocr_settings['min_page_chars'])
+    
+    def ocr_pdf_pages(self, pdf_path, page_numbers):
+        """OCR text of the given 1-based pages as {page_number: text}, in parallel when a pool is configured"""
+        pages = ((number, '') for number in page_numbers)
+        return dict(ocr.fill_scanned_pages(
+            pdf_path, pages, self.ocr_settings, self._pool(), window=max(self.pdf_processes, 1) * 2
+        ))
+    
     def extract_pdf_text(self, pdf_path):
         """Extract text from PDF"""
-        text = ""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-            return text
+            return ''.join(text for _, text in self.iter_pdf_pages(pdf_path))
         except Exception as e:
             raise Exception(f"PDF extraction error: {str(e)}")
     
-    def extract_pdf_content(self, pdf_path):
-        """Extract PDF content with metadata"""
+    def extract_pdf_content(self, pdf_path, page_start=1, page_end=None):
+        """Extract PDF content with metadata for pages page_start..page_end (1-based, inclusive)"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                num_pages = len(pdf_reader.pages)
-                
-                pages_content = []
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    pages_content.append({
-                        'page_number': page_num + 1,
-                        'text': text,
-                        'word_count': len(text.split())
-                    })
-                
-                return {
-                    'total_pages': num_pages,
-                    'pages': pages_content,
-                    'file_path': pdf_path
-                }
+            num_pages = pdf_pages.page_count(pdf_path)
+            page_end = num_pages if page_end is None else min(page_end, num_pages)
+            
+            pages_content = [{
+                'page_number': page_number,
+                'text': text,
+                'word_count': len(text.split())
+            } for page_number, text in self.iter_pdf_pages(pdf_path, page_start, page_end)]
+            
+            return {
+                'total_pages': num_pages,
+                'page_start': page_start,
+                'page_end': page_end,
+                'pages': pages_content,
+                'file_path': pdf_path
+            }
         except Exception as e:
             raise Exception(f"PDF processing error: {str(e)}")
     
@@ -70,19 +108,16 @@ class FileProcessor:
         """Extract text from DOCX"""
         try:
             doc = docx.Document(docx_path)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
+            return ''.join(para.text + "\n" for para in doc.paragraphs)
         except Exception as e:
             raise Exception(f"DOCX extraction error: {str(e)}")
     
     def ocr_image(self, image_path):
-        """Extract text from image using OCR"""
+        """Extract text from image using OCR (preprocessed, cached by content, tall images in parallel bands)"""
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
-            return text
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            return ocr.ocr_image_bytes(data, self.ocr_settings, self._pool(), self.pdf_processes)
         except Exception as e:
             raise Exception(f"OCR error: {str(e)}")
     
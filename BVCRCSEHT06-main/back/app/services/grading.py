@@ -0,0 +1,160 @@
+from app import db
+from app.models import Question, QuestionOption, StudentAnswer
+from app.utils.upsert import upsert
+from datetime import datetime
+import uuid
+
+OBJECTIVE_TYPES = ('mcq', 'multiple_select')
+
+UPSERT_COLUMNS = (
+    'selected_option_id', 'selected_option_ids', 'answer_text',
+    'points_earned', 'is_correct', 'answered_at'
+)
+
+def upsert_answers(rows):
+    """Insert or overwrite StudentAnswer rows on (attempt_id, question_id) in one executemany"""
+    upsert(StudentAnswer.__table__, rows, ['attempt_id', 'question_id'], overwrite=UPSERT_COLUMNS)
+
+def stored_answers(attempt_id):
+    """Load an attempt's saved answers as answer payloads keyed by question_id"""
+    rows = db.session.query(
+        StudentAnswer.question_id,
+        StudentAnswer.selected_option_id,
+        StudentAnswer.selected_option_ids,
+        StudentAnswer.answer_text
+    ).filter(StudentAnswer.attempt_id == attempt_id).all()
+
+    return {
+        question_id: {
+            'question_id': question_id,
+            'option_id': option_id,
+            'option_ids': option_ids,
+            'text': text
+        }
+        for question_id, option_id, option_ids, text in rows
+    }
+
+class AnswerKey:
+    """Compiled answer key for a single quiz"""
+
+    def __init__(self, quiz_id, questions):
+        """Build from {question_id: {'type', 'points', 'concepts', 'correct', 'options'}}"""
+        self.quiz_id = quiz_id
+        self.questions = questions
+        self.total_points = sum(q['points'] for q in questions.values())
+
+    @classmethod
+    def load(cls, quiz_id):
+        """Load every question and option of a quiz in a single query"""
+        rows = db.session.query(
+            Question.id,
+            Question.question_type,
+            Question.points,
+            Question.concepts,
+            QuestionOption.id,
+            QuestionOption.is_correct
+        ).outerjoin(
+            QuestionOption, QuestionOption.question_id == Question.id
+        ).filter(
+            Question.quiz_id == quiz_id
+        ).all()
+
+        questions = {}
+        for question_id, question_type, points, concepts, option_id, is_correct in rows:
+            entry = questions.setdefault(question_id, {
+                'type': question_type,
+                'points': points or 0,
+                'concepts': tuple(concepts or ()),
+                'correct': set(),
+                'options': set()
+            })
+            if option_id is not None:
+                entry['options'].add(option_id)
+                if is_correct:
+                    entry['correct'].add(option_id)
+
+        for entry in questions.values():
+            entry['correct'] = frozenset(entry['correct'])
+            entry['options'] = frozenset(entry['options'])
+
+        return cls(quiz_id, questions)
+
+class GradingEngine:
+    """Scores a whole answer vector in memory against an AnswerKey"""
+
+    def __init__(self, answer_key):
+        """Initialize grading engine"""
+        self.answer_key = answer_key
+
+    @staticmethod
+    def selected_options(answer_data):
+        """Normalise option_id / option_ids from an answer payload into a set"""
+        selected = set(answer_data.get('option_ids') or [])
+        if answer_data.get('option_id'):
+            selected.add(answer_data['option_id'])
+        return selected
+
+    def score(self, question_id, selected):
+        """Score one answer, returns (points_earned, is_correct)"""
+        entry = self.answer_key.questions[question_id]
+        points = entry['points']
+        correct = entry['correct']
+
+        if entry['type'] == 'mcq':
+            if len(selected) == 1 and selected <= correct:
+                return points, True
+            return 0, False
+
+        if entry['type'] == 'multiple_select':
+            if not correct:
+                return 0, False
+            # Partial credit: each right pick earns a share, each wrong pick cancels one
+            hits = len(selected & correct)
+            misses = len(selected - correct)
+            fraction = max(0.0, (hits - misses) / len(correct))
+            return round(points * fraction, 2), selected == correct
+
+        # Descriptive and coding answers are graded outside the engine
+        return 0, None
+
+    def grade(self, attempt, answers):
+        """Grade an attempt's answers, bulk upsert them and finalise the attempt"""
+        by_question = {}
+        for answer_data in answers:
+            question_id = answer_data.get('question_id')
+            if question_id in self.answer_key.questions:
+                by_question[question_id] = answer_data
+
+        now = datetime.utcnow()
+        rows = []
+        total_score = 0
+        for question_id, answer_data in by_question.items():
+            # Ignore option ids that do not belong to this question
+            selected = self.selected_options(answer_data) & self.answer_key.questions[question_id]['options']
+            points_earned, is_correct = self.score(question_id, selected)
+            total_score += points_earned
+
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'attempt_id': attempt.id,
+                'question_id': question_id,
+                'selected_option_id': next(iter(selected)) if len(selected) == 1 else None,
+                'selected_option_ids': sorted(selected) if selected else None,
+                'answer_text': answer_data.get('text'),
+                'points_earned': points_earned,
+                'is_correct': is_correct,
+                'answered_at': now
+            })
+
+        upsert_answers(rows)
+
+        total_points = self.answer_key.total_points
+        # Descriptive/coding answers still need AI grading before the attempt is final
+        pending = any(row['is_correct'] is None for row in rows)
+        attempt.status = 'submitted' if pending else 'completed'
+        attempt.score = total_score
+        attempt.total_points = total_points
+        attempt.percentage = (total_score / total_points * 100) if total_points > 0 else 0
+        attempt.completed_at = now
+
+        return rows
@@ -0,0 +1,194 @@
+from app import db
+from app.models import (
+    Question, QuestionOption, QuizAttempt, StudentAnswer,
+    QuestionStatistics, OptionStatistics
+)
+from app.services.grading import OBJECTIVE_TYPES
+from app.utils.upsert import upsert
+from datetime import datetime
+import math
+import numpy as np
+
+STAT_COLUMNS = ('attempts', 'correct_count', 'score_sum', 'score_sq_sum', 'correct_score_sum')
+
+# Distractors picked by fewer than this share of responders are not doing their job
+FUNCTIONAL_DISTRACTOR_RATE = 0.05
+
+def record_attempt(attempt, answer_key, rows):
+    """Fold one graded attempt into the running statistics.
+
+    Runs in the caller's transaction. Objective questions left unanswered
+    count as incorrect, matching how the attempt itself was scored.
+    """
+    answered = {row['question_id']: row for row in rows}
+    score = attempt.percentage or 0
+    now = datetime.utcnow()
+
+    question_rows = []
+    option_rows = []
+    for question_id, entry in answer_key.questions.items():
+        if entry['type'] not in OBJECTIVE_TYPES:
+            continue
+
+        row = answered.get(question_id)
+        correct = 1 if row and row['is_correct'] else 0
+        question_rows.append({
+            'question_id': question_id,
+            'quiz_id': attempt.quiz_id,
+            'attempts': 1,
+            'correct_count': correct,
+            'score_sum': score,
+            'score_sq_sum': score * score,
+            'correct_score_sum': score * correct,
+            'updated_at': now
+        })
+
+        for option_id in (row['selected_option_ids'] or []) if row else []:
+            option_rows.append({'option_id': option_id, 'question_id': question_id, 'pick_count': 1})
+
+    upsert(QuestionStatistics.__table__, question_rows, ['question_id'],
+           overwrite=('updated_at',), increment=STAT_COLUMNS)
+    upsert(OptionStatistics.__table__, option_rows, ['option_id'], increment=('pick_count',))
+
+def recompute_quiz(quiz_id, answer_key):
+    """Rebuild a quiz's statistics from stored answers (backfill).
+
+    Loads every completed attempt's objective answers in one query and
+    aggregates them as an attempts x questions matrix with NumPy.
+    """
+    question_ids = [qid for qid, entry in answer_key.questions.items() if entry['type'] in OBJECTIVE_TYPES]
+
+    attempts = db.session.query(QuizAttempt.id, QuizAttempt.percentage).filter(
+        QuizAttempt.quiz_id == quiz_id,
+        QuizAttempt.status == 'completed'
+    ).all()
+
+    answers = db.session.query(
+        StudentAnswer.attempt_id,
+        StudentAnswer.question_id,
+        StudentAnswer.is_correct,
+        StudentAnswer.selected_option_ids
+    ).join(
+        QuizAttempt, QuizAttempt.id == StudentAnswer.attempt_id
+    ).filter(
+        QuizAttempt.quiz_id == quiz_id,
+        QuizAttempt.status == 'completed'
+    ).all()
+
+    attempt_index = {attempt_id: i for i, (attempt_id, _) in enumerate(attempts)}
+    question_index = {question_id: j for j, question_id in enumerate(question_ids)}
+
+    scores = np.array([percentage or 0 for _, percentage in attempts], dtype=float)
+    correct = np.zeros((len(attempts), len(question_ids)), dtype=float)
+    picks = []
+    for attempt_id, question_id, is_correct, option_ids in answers:
+        if question_id not in question_index:
+            continue
+        if is_correct:
+            correct[attempt_index[attempt_id], question_index[question_id]] = 1
+        picks.extend(option_ids or [])
+
+    correct_counts = correct.sum(axis=0)
+    correct_score_sums = scores @ correct
+    score_sum = float(scores.sum())
+    score_sq_sum = float((scores ** 2).sum())
+
+    option_ids, pick_counts = np.unique(np.array(picks, dtype=object), return_counts=True) if picks else ([], [])
+    option_question = dict(db.session.query(QuestionOption.id, QuestionOption.question_id).filter(
+        QuestionOption.question_id.in_(question_ids)
+    ).all()) if question_ids else {}
+
+    now = datetime.utcnow()
+    OptionStatistics.query.filter(OptionStatistics.question_id.in_(question_ids)).delete(synchronize_session=False)
+    QuestionStatistics.query.filter(QuestionStatistics.quiz_id == quiz_id).delete(synchronize_session=False)
+
+    upsert(QuestionStatistics.__table__, [{
+        'question_id': question_id,
+        'quiz_id': quiz_id,
+        'attempts': len(attempts),
+        'correct_count': int(correct_counts[j]),
+        'score_sum': score_sum,
+        'score_sq_sum': score_sq_sum,
+        'correct_score_sum': float(correct_score_sums[j]),
+        'updated_at': now
+    } for j, question_id in enumerate(question_ids)] if attempts else [], ['question_id'],
+        overwrite=('updated_at',) + STAT_COLUMNS)
+
+    upsert(OptionStatistics.__table__, [{
+        'option_id': option_id,
+        'question_id': option_question[option_id],
+        'pick_count': int(count)
+    } for option_id, count in zip(option_ids, pick_counts) if option_id in option_question], ['option_id'],
+        overwrite=('pick_count',))
+
+    return len(attempts)
+
+def point_biserial(stats):
+    """Point-biserial correlation between getting the item right and the attempt score"""
+    n = stats.attempts
+    n1 = stats.correct_count
+    n0 = n - n1
+    if n1 == 0 or n0 == 0:
+        return None
+
+    mean = stats.score_sum / n
+    variance = stats.score_sq_sum / n - mean * mean
+    if variance <= 1e-12:
+        return None
+
+    mean_correct = stats.correct_score_sum / n1
+    mean_incorrect = (stats.score_sum - stats.correct_score_sum) / n0
+    return (mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(n1 * n0 / (n * n))
+
+def quiz_item_analysis(quiz_id):
+    """Difficulty, discrimination and distractor effectiveness per question, in O(questions)"""
+    questions = db.session.query(
+        Question.id, Question.question_text, Question.question_type, Question.order, QuestionStatistics
+    ).outerjoin(
+        QuestionStatistics, QuestionStatistics.question_id == Question.id
+    ).filter(
+        Question.quiz_id == quiz_id,
+        Question.question_type.in_(OBJECTIVE_TYPES)
+    ).order_by(Question.order).all()
+
+    options = db.session.query(
+        QuestionOption.id, QuestionOption.question_id, QuestionOption.option_text,
+        QuestionOption.is_correct, OptionStatistics.pick_count
+    ).join(
+        Question, Question.id == QuestionOption.question_id
+    ).outerjoin(
+        OptionStatistics, OptionStatistics.option_id == QuestionOption.id
+    ).filter(
+        Question.quiz_id == quiz_id
+    ).order_by(QuestionOption.order).all()
+
+    options_by_question = {}
+    for option in options:
+        options_by_question.setdefault(option.question_id, []).append(option)
+
+    items = []
+    for question_id, text, question_type, _, stats in questions:
+        attempts = stats.attempts if stats else 0
+        distractors = [{
+            'option_id': o.id,
+            'text': o.option_text,
+            'pick_count': o.pick_count or 0,
+            'pick_rate': (o.pick_count or 0) / attempts if attempts else None,
+            'functional': bool(attempts) and (o.pick_count or 0) / attempts >= FUNCTIONAL_DISTRACTOR_RATE
+        } for o in options_by_question.get(question_id, []) if not o.is_correct]
+
+        items.append({
+            'question_id': question_id,
+            'text': text,
+            'type': question_type,
+            'attempts': attempts,
+            'difficulty': stats.correct_count / attempts if attempts else None,
+            'discrimination': point_biserial(stats) if attempts else None,
+            'distractors': distractors,
+            'distractor_effectiveness': (
+                sum(1 for d in distractors if d['functional']) / len(distractors)
+                if distractors and attempts else None
+            )
+        })
+
+    return items
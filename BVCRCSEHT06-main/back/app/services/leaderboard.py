@@ -0,0 +1,206 @@
+from app import db
+from app.models import LeaderboardScore, Performance, Student, User
+from app.services.performance import OVERALL_SUBJECT
+from app.utils.upsert import upsert
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+import threading
+
+class SectionIndex:
+    """Ordered in-memory leaderboard for one section.
+
+    Keys are (-score, student_id) kept sorted, so rank lookups are a
+    binary search and top-K / page reads are list slices.
+    """
+
+    def __init__(self, loaded_at=None):
+        """Initialize empty index"""
+        self.keys = []
+        self.entries = {}
+        self.loaded_at = loaded_at
+
+    def apply(self, student_id, score, quizzes_taken, name, updated_at):
+        """Insert or move a student's entry, ignoring rows older than what is held"""
+        old = self.entries.get(student_id)
+        if old:
+            if old['updated_at'] and updated_at and old['updated_at'] > updated_at:
+                return
+            del self.keys[bisect_left(self.keys, (-old['score'], student_id))]
+
+        self.entries[student_id] = {
+            'score': score, 'quizzes_taken': quizzes_taken, 'student_name': name, 'updated_at': updated_at
+        }
+        insort(self.keys, (-score, student_id))
+
+    def remove(self, student_id):
+        """Drop a student's entry, e.g. after they moved to another section"""
+        old = self.entries.pop(student_id, None)
+        if old:
+            del self.keys[bisect_left(self.keys, (-old['score'], student_id))]
+
+    def rank(self, student_id):
+        """1-based rank of a student, or None if not ranked"""
+        entry = self.entries.get(student_id)
+        if not entry:
+            return None
+        return bisect_left(self.keys, (-entry['score'], student_id)) + 1
+
+    def page(self, offset, limit):
+        """Entries ranked offset+1 .. offset+limit"""
+        return [{
+            'rank': offset + i + 1,
+            'student_id': student_id,
+            'student_name': self.entries[student_id]['student_name'],
+            'score': self.entries[student_id]['score'],
+            'quizzes_taken': self.entries[student_id]['quizzes_taken']
+        } for i, (_, student_id) in enumerate(self.keys[offset:offset + limit])]
+
+class Leaderboards:
+    """Per-worker section leaderboards backed by the leaderboard_scores table.
+
+    Writes go to the table in the completing transaction. A section is
+    loaded in full on first read and reloaded every full_sync_seconds,
+    which also picks up rows deleted or rewritten by a rebuild in another
+    process. In between, each read pulls the rows changed in any section
+    since the last sync (plus a small lookback for commits that landed
+    out of timestamp order). A changed row moves its student out of the
+    section index that held them, so a student who changed section drops
+    off the old leaderboard straight away.
+    """
+
+    def __init__(self, sync_lag_seconds=5, full_sync_seconds=300):
+        """Initialize leaderboards"""
+        self.sync_lag = timedelta(seconds=sync_lag_seconds)
+        self.full_sync = timedelta(seconds=full_sync_seconds)
+        self._sections = {}
+        self._placement = {}  # student_id -> (section_id, updated_at) of the row last applied
+        self._synced_to = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read sync intervals from config"""
+        self.sync_lag = timedelta(seconds=app.config.get('LEADERBOARD_SYNC_LAG_SECONDS', 5))
+        self.full_sync = timedelta(seconds=app.config.get('LEADERBOARD_FULL_SYNC_SECONDS', 300))
+
+    def record(self, student_id):
+        """Refresh a student's persisted score from their Performance row (caller's transaction)"""
+        row = db.session.query(
+            Student.section_id, Performance.quiz_average, Performance.quiz_count
+        ).join(
+            Performance, Performance.student_id == Student.id
+        ).filter(
+            Student.id == student_id,
+            Performance.subject == OVERALL_SUBJECT
+        ).first()
+        if not row or not row.section_id:
+            return
+
+        upsert(LeaderboardScore.__table__, [{
+            'student_id': student_id,
+            'section_id': row.section_id,
+            'score': row.quiz_average or 0,
+            'quizzes_taken': row.quiz_count or 0,
+            'updated_at': datetime.utcnow()
+        }], ['student_id'], overwrite=('section_id', 'score', 'quizzes_taken', 'updated_at'))
+
+    @staticmethod
+    def _rows(*criteria):
+        return db.session.query(
+            LeaderboardScore.student_id, LeaderboardScore.section_id, LeaderboardScore.score,
+            LeaderboardScore.quizzes_taken, LeaderboardScore.updated_at, User.first_name, User.last_name
+        ).join(
+            Student, Student.id == LeaderboardScore.student_id
+        ).join(
+            User, User.id == Student.user_id
+        ).filter(*criteria).all()
+
+    def _place(self, student_id, section_id, score, quizzes_taken, updated_at, first_name, last_name):
+        """Apply one row, moving the student out of their previous section (call with the lock held)"""
+        held = self._placement.get(student_id)
+        if held:
+            if held[1] and updated_at and held[1] > updated_at:
+                return
+            if held[0] != section_id and held[0] in self._sections:
+                self._sections[held[0]].remove(student_id)
+        self._placement[student_id] = (section_id, updated_at)
+
+        index = self._sections.get(section_id)
+        if index is not None:
+            index.apply(student_id, score, quizzes_taken, first_name + ' ' + last_name, updated_at)
+
+    def _sync(self, section_id):
+        started = datetime.utcnow()
+        with self._lock:
+            index = self._sections.get(section_id)
+            reload = index is None or index.loaded_at < started - self.full_sync
+            since = self._synced_to - self.sync_lag if self._synced_to else None
+
+        if reload:
+            rows = self._rows(LeaderboardScore.section_id == section_id)
+            with self._lock:
+                index = self._sections[section_id] = SectionIndex(loaded_at=started)
+                for student_id in [k for k, (held, _) in self._placement.items() if held == section_id]:
+                    del self._placement[student_id]
+                for row in rows:
+                    self._place(*row)
+                if self._synced_to is None:
+                    self._synced_to = started
+
+        if since is not None:
+            rows = self._rows(LeaderboardScore.updated_at >= since)
+            with self._lock:
+                for row in rows:
+                    self._place(*row)
+                    if row.updated_at and row.updated_at > self._synced_to:
+                        self._synced_to = row.updated_at
+        return index
+
+    def top(self, section_id, offset=0, limit=50):
+        """Ranked page of a section leaderboard and its size"""
+        index = self._sync(section_id)
+        with self._lock:
+            return index.page(offset, limit), len(index.keys)
+
+    def standing(self, section_id, student_id):
+        """A student's rank, score and the section size"""
+        index = self._sync(section_id)
+        with self._lock:
+            rank = index.rank(student_id)
+            entry = index.entries.get(student_id, {})
+            return {
+                'rank': rank,
+                'score': entry.get('score'),
+                'quizzes_taken': entry.get('quizzes_taken', 0),
+                'total_ranked': len(index.keys)
+            }
+
+    def rebuild(self):
+        """Rewrite every persisted score from Performance and drop in-memory indexes"""
+        rows = db.session.query(
+            Student.id, Student.section_id, Performance.quiz_average, Performance.quiz_count
+        ).join(
+            Performance, Performance.student_id == Student.id
+        ).filter(
+            Performance.subject == OVERALL_SUBJECT,
+            Performance.quiz_count > 0,
+            Student.section_id.isnot(None)
+        ).all()
+
+        now = datetime.utcnow()
+        LeaderboardScore.query.delete(synchronize_session=False)
+        upsert(LeaderboardScore.__table__, [{
+            'student_id': student_id,
+            'section_id': section_id,
+            'score': score or 0,
+            'quizzes_taken': count,
+            'updated_at': now
+        } for student_id, section_id, score, count in rows], ['student_id'],
+            overwrite=('section_id', 'score', 'quizzes_taken', 'updated_at'))
+
+        with self._lock:
+            self._sections.clear()
+            self._placement.clear()
+            self._synced_to = None
+        return len(rows)
+
+leaderboards = Leaderboards()
@@ -0,0 +1,176 @@
+from PIL import Image, ImageOps
+import numpy as np
+import pytesseract
+import PyPDF2
+from collections import deque
+import hashlib
+import io
+import os
+import tempfile
+
+# Part of every cache key; bump when preprocessing changes so cached text is recomputed
+OCR_VERSION = 1
+
+# Deskew search: degrees either side of horizontal, step, and working width
+DESKEW_MAX_ANGLE = 5
+DESKEW_STEP = 0.5
+DESKEW_WIDTH = 800
+
+# Pixels darker than this count as ink
+INK_THRESHOLD = 128
+
+def preprocess(image, target_dpi=300, max_side=4000):
+    """Grayscale, downscale to target_dpi (or max_side when the DPI is unknown or wrong) and deskew"""
+    dpi = (image.info.get('dpi') or (0, 0))[0]
+    gray = ImageOps.exif_transpose(image).convert('L')
+
+    scale = target_dpi / dpi if dpi and dpi > target_dpi else 1.0
+    longest = max(gray.size) * scale
+    if longest > max_side:
+        scale *= max_side / longest
+    if scale < 1:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS)
+
+    angle = skew_angle(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return gray
+
+def skew_angle(gray):
+    """Rotation (degrees, counter-clockwise) that best levels the text lines.
+
+    Projection profile: on a small binarised copy, the angle whose row
+    sums vary the most is the one where lines of text are horizontal.
+    """
+    small = gray
+    if gray.width > DESKEW_WIDTH:
+        small = gray.resize((DESKEW_WIDTH, max(1, round(gray.height * DESKEW_WIDTH / gray.width))))
+    ink = Image.fromarray(((np.asarray(small) < INK_THRESHOLD) * 255).astype(np.uint8))
+    if not np.asarray(ink).any():
+        return 0
+
+    best_angle, best_score = 0, None
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        rows = np.asarray(ink.rotate(angle, expand=True), dtype=np.float64).sum(axis=1)
+        score = np.square(np.diff(rows)).sum()
+        if best_score is None or score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle if abs(best_angle) >= DESKEW_STEP else 0
+
+def split_bands(gray, parts):
+    """Cut an image into up to `parts` horizontal bands at blank rows, so no text line is split"""
+    height = gray.height
+    if parts < 2:
+        return [gray]
+
+    ink_rows = (np.asarray(gray) < INK_THRESHOLD).sum(axis=1)
+    blank = np.flatnonzero(ink_rows <= gray.width * 0.002)
+    if not blank.size:
+        return [gray]
+
+    cuts = [0]
+    slack = height / (parts * 4)
+    for i in range(1, parts):
+        target = height * i / parts
+        nearest = blank[np.abs(blank - target).argmin()]
+        if abs(nearest - target) <= slack and nearest > cuts[-1]:
+            cuts.append(int(nearest))
+    cuts.append(height)
+    return [gray.crop((0, top, gray.width, bottom)) for top, bottom in zip(cuts, cuts[1:]) if bottom > top]
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def ocr_png(data, lang='eng'):
+    """OCR one preprocessed image (PNG bytes); runs in pool processes"""
+    return pytesseract.image_to_string(Image.open(io.BytesIO(data)), lang=lang)
+
+def cache_key(data, settings):
+    """Hash of the image bytes and everything that changes the OCR output"""
+    digest = hashlib.sha256(data)
+    digest.update(f"|{OCR_VERSION}|{settings['lang']}|{settings['target_dpi']}|{settings['max_side']}".encode())
+    return digest.hexdigest()
+
+def _cache_path(settings, key):
+    return os.path.join(settings['cache_dir'], key[:2], key + '.txt')
+
+def cache_get(settings, key):
+    try:
+        with open(_cache_path(settings, key), 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def cache_put(settings, key, text):
+    path = _cache_path(settings, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def ocr_image_bytes(data, settings, pool=None, processes=0):
+    """OCR an encoded image, using the cache; tall images are split into bands across the pool"""
+    key = cache_key(data, settings)
+    text = cache_get(settings, key)
+    if text is not None:
+        return text
+
+    gray = preprocess(Image.open(io.BytesIO(data)), settings['target_dpi'], settings['max_side'])
+    if pool is not None and processes > 1 and gray.height >= settings['tile_min_height']:
+        bands = [_png(band) for band in split_bands(gray, processes)]
+        text = '\n'.join(pool.map(ocr_png, bands, [settings['lang']] * len(bands)))
+    else:
+        text = pytesseract.image_to_string(gray, lang=settings['lang'])
+
+    cache_put(settings, key, text)
+    return text
+
+def ocr_pdf_page(pdf_path, index, settings):
+    """OCR the scanned images of one PDF page (0-based); runs in pool processes"""
+    with open(pdf_path, 'rb') as file:
+        page = PyPDF2.PdfReader(file).pages[index]
+        images = [image.data for image in page.images]
+    return '\n'.join(ocr_image_bytes(data, settings) for data in images)
+
+def needs_ocr(text, min_chars):
+    """True for pages whose text layer is empty or nearly so (scans)"""
+    return len(''.join((text or '').split())) < min_chars
+
+def fill_scanned_pages(pdf_path, pages, settings, pool=None, window=8):
+    """Pass (page_number, text) through, replacing text-less pages with their OCR text.
+
+    Scanned pages are OCR'd on the pool while later pages are read,
+    with at most `window` pages in flight; output stays in page order.
+    A page whose OCR fails keeps its original text.
+    """
+    pending = deque()
+
+    def resolve(entry):
+        number, text, future = entry
+        if future is None:
+            return number, text
+        try:
+            return number, future.result() or text
+        except Exception:
+            return number, text
+
+    for number, text in pages:
+        future = None
+        if needs_ocr(text, settings['min_page_chars']):
+            if pool is not None:
+                future = pool.submit(ocr_pdf_page, pdf_path, number - 1, settings)
+            else:
+                try:
+                    text = ocr_pdf_page(pdf_path, number - 1, settings) or text
+                except Exception:
+                    pass
+        pending.append((number, text, future))
+
+        while pending and (pending[0][2] is None or pending[0][2].done() or len(pending) > window):
+            yield resolve(pending.popleft())
+
+    while pending:
+        yield resolve(pending.popleft())
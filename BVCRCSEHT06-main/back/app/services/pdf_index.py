@@ -0,0 +1,229 @@
+from app.services.blob_store import blob_store
+from app.services.file_processor import FileProcessor
+from collections import OrderedDict
+import json
+import os
+import re
+import tempfile
+import threading
+
+INDEX_VERSION = 3
+
+class PDFIndex:
+    """Extracted page texts of one PDF.
+
+    The text layer is stored back to back in a UTF-8 sidecar file; page n
+    spans bytes offsets[n - 1]:offsets[n], so any page range is one seek
+    and one read, with no PDF parsing. Scanned pages (no usable text
+    layer) are listed in `scanned`; their OCR text is filled in lazily,
+    a requested range at a time, and kept in `ocr_texts`.
+    """
+
+    def __init__(self, text_path, offsets, word_counts, scanned=(), ocr_texts=None):
+        """Initialize index"""
+        self.text_path = text_path
+        self.offsets = offsets
+        self.word_counts = word_counts
+        self.scanned = set(scanned)
+        self.ocr_texts = ocr_texts or {}
+
+    @property
+    def total_pages(self):
+        return len(self.word_counts)
+
+    def pending_ocr(self, page_start=1, page_end=None):
+        """Scanned pages in page_start..page_end whose OCR text is not filled in yet"""
+        page_end = self.total_pages if page_end is None else page_end
+        return sorted(n for n in self.scanned if page_start <= n <= page_end and n not in self.ocr_texts)
+
+    def pages(self, page_start=1, page_end=None):
+        """[(page_number, text, word_count)] for 1-based pages page_start..page_end"""
+        page_end = self.total_pages if page_end is None else min(page_end, self.total_pages)
+        if page_start > page_end:
+            return []
+
+        base = self.offsets[page_start - 1]
+        with open(self.text_path, 'rb') as f:
+            f.seek(base)
+            data = f.read(self.offsets[page_end] - base)
+
+        pages = []
+        for number in range(page_start, page_end + 1):
+            text = self.ocr_texts.get(number)
+            if text is None:
+                text = data[self.offsets[number - 1] - base:self.offsets[number] - base].decode('utf-8')
+                pages.append((number, text, self.word_counts[number - 1]))
+            else:
+                pages.append((number, text, len(text.split())))
+        return pages
+
+    def text(self):
+        """Whole document text"""
+        if self.ocr_texts:
+            return ''.join(text for _, text, _ in self.pages())
+        with open(self.text_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def search(self, word, limit=50, context=60):
+        """Pages containing word (case-insensitive, whole word) with a snippet of its first match"""
+        pattern = re.compile(r'\b' + re.escape(word) + r'\b', re.IGNORECASE)
+        matches = []
+        for number, text, _ in self.pages():
+            found = pattern.findall(text)
+            if not found:
+                continue
+            first = pattern.search(text)
+            matches.append({
+                'page_number': number,
+                'count': len(found),
+                'snippet': text[max(first.start() - context, 0):first.end() + context]
+            })
+            if len(matches) >= limit:
+                break
+        return matches
+
+class PDFIndexStore:
+    """Sidecar page indexes for stored PDFs, keyed by content hash.
+
+    The index is written next to the blob the first time a PDF is read
+    (<sha256>.pages.txt and <sha256>.pages.json) and reused by every
+    later read of the same content. Building it only reads the text
+    layer, so it stays fast for scanned documents; OCR runs per request
+    for just the scanned pages being read and is saved in
+    <sha256>.ocr.json. Parsed index metadata is kept in a small
+    per-worker LRU; the text sidecars never change once written, and the
+    OCR sidecar only grows.
+    """
+
+    def __init__(self, max_cached=64):
+        """Initialize store"""
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read cache size from config"""
+        self.max_cached = app.config.get('PDF_INDEX_CACHE_SIZE', self.max_cached)
+
+    @staticmethod
+    def paths(sha256):
+        """Text and metadata sidecar paths of a blob"""
+        return blob_store.path_for(sha256, '.pages.txt'), blob_store.path_for(sha256, '.pages.json')
+
+    @staticmethod
+    def _read_ocr(sha256):
+        try:
+            with open(blob_store.path_for(sha256, '.ocr.json'), 'r', encoding='utf-8') as f:
+                return {int(number): text for number, text in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, sha256):
+        """Index of a blob, or None if it has not been built"""
+        with self._lock:
+            index = self._cache.get(sha256)
+            if index:
+                self._cache.move_to_end(sha256)
+                return index
+
+        text_path, meta_path = self.paths(sha256)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != INDEX_VERSION:
+            return None
+
+        index = PDFIndex(
+            text_path, meta['offsets'], meta['word_counts'], meta.get('scanned', ()), self._read_ocr(sha256)
+        )
+        self._remember(sha256, index)
+        return index
+
+    def build(self, sha256, pdf_path, file_processor=None):
+        """Extract every page's text layer once, streaming it into the sidecars, and return the index.
+
+        No OCR runs here: pages without a usable text layer are only
+        recorded as scanned, and fill_ocr() reads them when requested.
+        """
+        file_processor = file_processor or FileProcessor()
+        text_path, meta_path = self.paths(sha256)
+        directory = os.path.dirname(text_path)
+        offsets = [0]
+        word_counts = []
+        scanned = []
+
+        fd, temp_text = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for number, text in file_processor.iter_pdf_pages(pdf_path, use_ocr=False):
+                    if file_processor.needs_ocr(text):
+                        scanned.append(number)
+                    data = text.encode('utf-8')
+                    out.write(data)
+                    offsets.append(offsets[-1] + len(data))
+                    word_counts.append(len(text.split()))
+            os.replace(temp_text, text_path)
+        finally:
+            if os.path.exists(temp_text):
+                os.remove(temp_text)
+
+        # Metadata is written last: its presence marks the index complete
+        fd, temp_meta = tempfile.mkstemp(dir=directory, suffix='.part')
+        with os.fdopen(fd, 'w') as out:
+            json.dump({
+                'version': INDEX_VERSION, 'offsets': offsets, 'word_counts': word_counts, 'scanned': scanned
+            }, out)
+        os.replace(temp_meta, meta_path)
+
+        index = PDFIndex(text_path, offsets, word_counts, scanned, self._read_ocr(sha256))
+        self._remember(sha256, index)
+        return index
+
+    def fill_ocr(self, sha256, pdf_path, index, page_start=1, page_end=None, file_processor=None):
+        """OCR the scanned pages of page_start..page_end not filled in yet and save them to the OCR sidecar.
+
+        Callers keep the range small (one /pdf/read page window), so a
+        request never OCRs a whole document. Does nothing when
+        OCR_SCANNED_PDFS is off.
+        """
+        file_processor = file_processor or FileProcessor()
+        if not file_processor.ocr_scanned_pdfs or not index.pending_ocr(page_start, page_end):
+            return index
+
+        # Another worker may have filled some of them already
+        with self._lock:
+            index.ocr_texts.update(self._read_ocr(sha256))
+        pending = index.pending_ocr(page_start, page_end)
+        if not pending:
+            return index
+
+        # Empty results (OCR failed or the page is blank) are not saved, so they are tried again
+        texts = {number: text for number, text in file_processor.ocr_pdf_pages(pdf_path, pending).items() if text}
+        if not texts:
+            return index
+
+        path = blob_store.path_for(sha256, '.ocr.json')
+        with self._lock:
+            merged = self._read_ocr(sha256)
+            merged.update(texts)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+            with os.fdopen(fd, 'w', encoding='utf-8') as out:
+                json.dump({str(number): text for number, text in merged.items()}, out)
+            os.replace(temp_path, path)
+            index.ocr_texts.update(merged)
+        return index
+
+    def get_or_build(self, sha256, pdf_path):
+        """Index of a blob, building it (text layer only) on first use"""
+        return self.get(sha256) or self.build(sha256, pdf_path)
+
+    def _remember(self, sha256, index):
+        with self._lock:
+            self._cache[sha256] = index
+            self._cache.move_to_end(sha256)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+pdf_index = PDFIndexStore()
@@ -0,0 +1,64 @@
+import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+
+# Pool shared by every request in this worker, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+def page_count(pdf_path):
+    """Number of pages in a PDF"""
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def extract_range(pdf_path, start, end):
+    """Texts of pages [start, end) (0-based); runs in pool processes, so it only needs PyPDF2"""
+    with open(pdf_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        return [pages[i].extract_text() or '' for i in range(start, min(end, len(pages)))]
+
+def get_pool(processes):
+    """Process pool for page extraction.
+
+    Uses spawn so pool processes never inherit a copy of a threaded web
+    worker (open DB connections, held locks).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def iter_pages(pdf_path, start=0, end=None, processes=0, pages_per_task=25, parallel_min_pages=100):
+    """Yield (page_number, text) for pages [start, end) in order.
+
+    Ranges of at least parallel_min_pages are split into chunks of
+    pages_per_task and extracted on a process pool; chunks are yielded
+    in order as they complete, so callers can start using the first
+    pages while later ones are still being parsed.
+    """
+    with open(pdf_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        end = len(pages) if end is None else min(end, len(pages))
+
+        if not (processes > 1 and end - start >= parallel_min_pages):
+            for i in range(start, end):
+                yield i + 1, pages[i].extract_text() or ''
+            return
+
+    bounds = [(s, min(s + pages_per_task, end)) for s in range(start, end, pages_per_task)]
+    chunks = get_pool(processes).map(
+        extract_range, [pdf_path] * len(bounds), [s for s, _ in bounds], [e for _, e in bounds]
+    )
+    for (chunk_start, _), texts in zip(bounds, chunks):
+        for offset, text in enumerate(texts):
+            yield chunk_start + offset + 1, text
+
+def shutdown():
+    """Stop the pool (if one was started)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
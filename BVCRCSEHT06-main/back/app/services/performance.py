@@ -0,0 +1,144 @@
+from app import db
+from app.models import Performance, QuizAttempt, Quiz, Submission, Assignment
+from app.utils.upsert import dialect_insert
+from sqlalchemy import func, case
+from datetime import datetime
+import uuid
+
+# Performance row holding a student's aggregates across every subject
+OVERALL_SUBJECT = 'overall'
+
+def _average(total, count):
+    return case((count > 0, total / count), else_=0.0)
+
+def _apply(student_id, subject, quiz_score=0.0, quiz_count=0, assignment_score=0.0, assignment_count=0):
+    """Add deltas to the running sums of the overall row and the subject row.
+
+    Averages are recomputed inside the same UPSERT from the new sums, so
+    concurrent writers never lose an update.
+    """
+    table = Performance.__table__
+    now = datetime.utcnow()
+    subjects = [OVERALL_SUBJECT] + ([subject] if subject and subject != OVERALL_SUBJECT else [])
+
+    quiz_avg = quiz_score / quiz_count if quiz_count > 0 else 0.0
+    assignment_avg = assignment_score / assignment_count if assignment_count > 0 else 0.0
+    rows = [{
+        'id': str(uuid.uuid4()),
+        'student_id': student_id,
+        'subject': s,
+        'quiz_score_sum': quiz_score,
+        'quiz_count': quiz_count,
+        'assignment_score_sum': assignment_score,
+        'assignment_count': assignment_count,
+        'quiz_average': quiz_avg,
+        'assignment_average': assignment_avg,
+        'overall_score': (quiz_avg + assignment_avg) / 2,
+        'last_updated': now
+    } for s in subjects]
+
+    stmt = dialect_insert(table)
+    excluded = stmt.excluded
+    quiz_sum = table.c.quiz_score_sum + excluded.quiz_score_sum
+    quiz_n = table.c.quiz_count + excluded.quiz_count
+    assignment_sum = table.c.assignment_score_sum + excluded.assignment_score_sum
+    assignment_n = table.c.assignment_count + excluded.assignment_count
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id', 'subject'],
+        set_={
+            'quiz_score_sum': quiz_sum,
+            'quiz_count': quiz_n,
+            'assignment_score_sum': assignment_sum,
+            'assignment_count': assignment_n,
+            'quiz_average': _average(quiz_sum, quiz_n),
+            'assignment_average': _average(assignment_sum, assignment_n),
+            'overall_score': (_average(quiz_sum, quiz_n) + _average(assignment_sum, assignment_n)) / 2,
+            'last_updated': excluded.last_updated
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def record_quiz_completion(student_id, subject, percentage):
+    """Fold a completed quiz attempt into the student's aggregates (caller's transaction)"""
+    _apply(student_id, subject, quiz_score=percentage or 0, quiz_count=1)
+
+def record_submission_grade(student_id, subject, grade, previous_grade=None):
+    """Fold a graded submission in; a re-grade only shifts the sum by the difference"""
+    if previous_grade is None:
+        _apply(student_id, subject, assignment_score=grade, assignment_count=1)
+    else:
+        _apply(student_id, subject, assignment_score=grade - previous_grade)
+
+def get_overall(student_id):
+    """Read a student's overall aggregates row"""
+    return Performance.query.filter_by(student_id=student_id, subject=OVERALL_SUBJECT).first()
+
+def rebuild(student_id=None):
+    """Recompute every aggregate from the raw tables (backfill).
+
+    Uses grouped SQL aggregates, one query per source, and overwrites the
+    sums and averages of existing rows while keeping their other columns.
+    """
+    quiz_query = db.session.query(
+        QuizAttempt.student_id, Quiz.subject,
+        func.sum(QuizAttempt.percentage), func.count(QuizAttempt.id)
+    ).join(Quiz, Quiz.id == QuizAttempt.quiz_id).filter(
+        QuizAttempt.status == 'completed'
+    ).group_by(QuizAttempt.student_id, Quiz.subject)
+
+    assignment_query = db.session.query(
+        Submission.student_id, Assignment.subject,
+        func.sum(Submission.grade), func.count(Submission.id)
+    ).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Submission.status == 'graded',
+        Submission.grade.isnot(None)
+    ).group_by(Submission.student_id, Assignment.subject)
+
+    if student_id:
+        quiz_query = quiz_query.filter(QuizAttempt.student_id == student_id)
+        assignment_query = assignment_query.filter(Submission.student_id == student_id)
+
+    totals = {}
+    def bucket(sid, subject):
+        return totals.setdefault((sid, subject), [0.0, 0, 0.0, 0])
+
+    for sid, subject, score_sum, count in quiz_query:
+        for s in {OVERALL_SUBJECT, subject or OVERALL_SUBJECT}:
+            bucket(sid, s)[0] += score_sum or 0
+            bucket(sid, s)[1] += count
+    for sid, subject, score_sum, count in assignment_query:
+        for s in {OVERALL_SUBJECT, subject or OVERALL_SUBJECT}:
+            bucket(sid, s)[2] += score_sum or 0
+            bucket(sid, s)[3] += count
+
+    reset = Performance.query
+    if student_id:
+        reset = reset.filter(Performance.student_id == student_id)
+    reset.update({
+        'quiz_score_sum': 0, 'quiz_count': 0, 'assignment_score_sum': 0, 'assignment_count': 0,
+        'quiz_average': 0, 'assignment_average': 0, 'overall_score': 0
+    }, synchronize_session=False)
+
+    for (sid, subject), (quiz_sum, quiz_n, assignment_sum, assignment_n) in totals.items():
+        _apply_exact(sid, subject, quiz_sum, quiz_n, assignment_sum, assignment_n)
+
+    return len(totals)
+
+def _apply_exact(student_id, subject, quiz_sum, quiz_n, assignment_sum, assignment_n):
+    """Add totals to a single (already reset) row"""
+    table = Performance.__table__
+    quiz_avg = quiz_sum / quiz_n if quiz_n else 0.0
+    assignment_avg = assignment_sum / assignment_n if assignment_n else 0.0
+    values = {
+        'quiz_score_sum': quiz_sum,
+        'quiz_count': quiz_n,
+        'assignment_score_sum': assignment_sum,
+        'assignment_count': assignment_n,
+        'quiz_average': quiz_avg,
+        'assignment_average': assignment_avg,
+        'overall_score': (quiz_avg + assignment_avg) / 2,
+        'last_updated': datetime.utcnow()
+    }
+    stmt = dialect_insert(table).values(id=str(uuid.uuid4()), student_id=student_id, subject=subject, **values)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['student_id', 'subject'], set_=values))
@@ -0,0 +1,56 @@
+from app import db
+from app.models import QuizAttempt, Quiz, Submission, Assignment
+from sqlalchemy import func
+
+def recent_quiz_scores(student_id, limit):
+    """Last `limit` completed attempts, oldest first, with quiz titles in the same query"""
+    rows = db.session.query(
+        QuizAttempt.percentage, QuizAttempt.completed_at, Quiz.title
+    ).join(
+        Quiz, Quiz.id == QuizAttempt.quiz_id
+    ).filter(
+        QuizAttempt.student_id == student_id,
+        QuizAttempt.status == 'completed'
+    ).order_by(QuizAttempt.completed_at.desc()).limit(limit).all()
+
+    return [{
+        'quiz_num': i + 1,
+        'quiz': title,
+        'score': percentage,
+        'completed_at': completed_at.isoformat() if completed_at else None
+    } for i, (percentage, completed_at, title) in enumerate(reversed(rows))]
+
+def daily_quiz_scores(student_id, start, end):
+    """Average completed-attempt score per day in [start, end), bucketed in SQL"""
+    day = func.date(QuizAttempt.completed_at)
+    rows = db.session.query(
+        day, func.avg(QuizAttempt.percentage), func.count(QuizAttempt.id)
+    ).filter(
+        QuizAttempt.student_id == student_id,
+        QuizAttempt.status == 'completed',
+        QuizAttempt.completed_at >= start,
+        QuizAttempt.completed_at < end
+    ).group_by(day).order_by(day).all()
+
+    return [{
+        'date': str(date),
+        'score': average,
+        'quizzes': count
+    } for date, average, count in rows]
+
+def recent_submissions(student_id, limit, start=None, end=None):
+    """Latest submissions, newest first, with assignment titles in the same query"""
+    query = db.session.query(
+        Assignment.title, Submission.grade, Submission.ai_feedback, Submission.submission_date
+    ).join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).filter(Submission.student_id == student_id)
+    if start:
+        query = query.filter(Submission.submission_date >= start, Submission.submission_date < end)
+
+    return [{
+        'title': title,
+        'grade': grade,
+        'feedback': feedback,
+        'submitted_at': submitted_at.isoformat() if submitted_at else None
+    } for title, grade, feedback, submitted_at in query.order_by(Submission.submission_date.desc()).limit(limit)]
@@ -0,0 +1,192 @@
+from app import db
+from app.models import Question, QuestionOption
+from app.services.concepts import normalize as normalize_concepts
+from sqlalchemy import insert, func
+from datetime import datetime
+import csv
+import io
+import json
+import uuid
+
+QUESTION_TYPES = ('mcq', 'multiple_select', 'coding', 'descriptive')
+
+class RowError(ValueError):
+    """A single import row failed validation"""
+
+class QuestionImporter:
+    """Streaming question-bank importer for JSON Lines and CSV.
+
+    Rows are parsed and validated one at a time and valid ones are written
+    with executemany inserts every `batch_size` questions, all inside the
+    caller's transaction. Invalid rows are reported and skipped.
+    """
+
+    def __init__(self, quiz_id, batch_size=500, max_errors=100):
+        """Initialize importer"""
+        self.quiz_id = quiz_id
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self._questions = []
+        self._options = []
+
+        max_order = db.session.query(func.max(Question.order)).filter(Question.quiz_id == quiz_id).scalar()
+        self._next_order = (max_order or 0) + 1
+
+    @staticmethod
+    def iter_jsonl(stream):
+        """Yield (row_number, record) from a JSON Lines text stream"""
+        for row_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, RowError(f'Invalid JSON: {e.msg}')
+
+    @staticmethod
+    def iter_csv(stream):
+        """Yield (row_number, record) from a CSV text stream.
+
+        Columns: type, text, points, order, options, correct, concepts.
+        `options` is pipe-separated and `correct` lists the 1-based indexes
+        of the correct options, also pipe-separated, as is `concepts`.
+        """
+        reader = csv.DictReader(stream)
+        for record in reader:
+            row_number = reader.line_num
+            try:
+                options = [o.strip() for o in (record.get('options') or '').split('|') if o.strip()]
+                correct = {int(i) for i in (record.get('correct') or '').split('|') if i.strip()}
+            except ValueError:
+                yield row_number, RowError('correct must list option numbers like 1|3')
+                continue
+
+            yield row_number, {
+                'type': record.get('type'),
+                'text': record.get('text'),
+                'points': record.get('points') or None,
+                'order': record.get('order') or None,
+                'concepts': record.get('concepts'),
+                'options': [{'text': text, 'correct': i in correct} for i, text in enumerate(options, 1)]
+            }
+
+    def validate(self, record):
+        """Normalise one record, raises RowError if it is invalid"""
+        if isinstance(record, RowError):
+            raise record
+        if not isinstance(record, dict):
+            raise RowError('Row must be an object')
+
+        question_type = str(record.get('type') or 'mcq').strip().lower()
+        if question_type not in QUESTION_TYPES:
+            raise RowError(f'Unknown question type: {question_type}')
+
+        text = str(record.get('text') or '').strip()
+        if not text:
+            raise RowError('Question text required')
+
+        try:
+            points = int(record.get('points') or 1)
+            order = int(record['order']) if record.get('order') is not None else None
+        except (TypeError, ValueError):
+            raise RowError('points and order must be integers')
+        if points <= 0:
+            raise RowError('points must be positive')
+
+        concepts = record.get('concepts')
+        if concepts is not None and not isinstance(concepts, (list, str)):
+            raise RowError('concepts must be a list')
+
+        options = record.get('options') or []
+        if not isinstance(options, list):
+            raise RowError('options must be a list')
+        options = [
+            o if isinstance(o, dict) else {'text': o}
+            for o in options
+        ]
+        if any(not str(o.get('text') or '').strip() for o in options):
+            raise RowError('Option text required')
+
+        correct_count = sum(1 for o in options if o.get('correct'))
+        if question_type in ('mcq', 'multiple_select'):
+            if len(options) < 2:
+                raise RowError(f'{question_type} needs at least 2 options')
+            if question_type == 'mcq' and correct_count != 1:
+                raise RowError('mcq needs exactly 1 correct option')
+            if question_type == 'multiple_select' and correct_count < 1:
+                raise RowError('multiple_select needs at least 1 correct option')
+        elif options:
+            raise RowError(f'{question_type} questions take no options')
+
+        return {
+            'type': question_type,
+            'text': text,
+            'points': points,
+            'order': order,
+            'concepts': normalize_concepts(concepts),
+            'options': options
+        }
+
+    def add(self, question):
+        """Queue a validated question and its options for insertion"""
+        question_id = str(uuid.uuid4())
+        order = question['order'] if question['order'] is not None else self._next_order
+        self._next_order = max(self._next_order, order) + 1
+
+        self._questions.append({
+            'id': question_id,
+            'quiz_id': self.quiz_id,
+            'question_type': question['type'],
+            'question_text': question['text'],
+            'points': question['points'],
+            'order': order,
+            'concepts': question['concepts'] or None,
+            'created_at': datetime.utcnow()
+        })
+        for i, option in enumerate(question['options'], 1):
+            self._options.append({
+                'id': str(uuid.uuid4()),
+                'question_id': question_id,
+                'option_text': str(option['text']).strip(),
+                'is_correct': bool(option.get('correct')),
+                'order': i,
+                'explanation': option.get('explanation')
+            })
+
+        if len(self._questions) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write queued questions and options with one executemany each"""
+        if self._questions:
+            db.session.execute(insert(Question.__table__), self._questions)
+            self.imported += len(self._questions)
+        if self._options:
+            db.session.execute(insert(QuestionOption.__table__), self._options)
+        self._questions = []
+        self._options = []
+
+    def run(self, records):
+        """Import (row_number, record) pairs, returns a summary"""
+        for row_number, record in records:
+            try:
+                self.add(self.validate(record))
+            except RowError as e:
+                self.error_count += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({'row': row_number, 'error': str(e)})
+        self.flush()
+
+        return {
+            'imported': self.imported,
+            'failed': self.error_count,
+            'errors': self.errors
+        }
+
+def open_text_stream(binary_stream):
+    """Wrap an uploaded binary stream for line-by-line decoding"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
@@ -0,0 +1,143 @@
+from app import db
+from app.models import Quiz, Question, QuestionOption
+from app.services.grading import AnswerKey, OBJECTIVE_TYPES
+from app.services.response_cache import bump_after_commit
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import selectinload, object_session
+from collections import OrderedDict
+from datetime import datetime
+import threading
+
+class QuizCache:
+    """Per-worker LRU cache of compiled quiz papers and answer keys.
+
+    Entries are keyed by (kind, quiz_id, Quiz.updated_at), so any edit that
+    bumps updated_at makes stale entries unreachable in every worker.
+    """
+
+    def __init__(self, max_entries=256):
+        """Initialize cache"""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Read cache size from app config"""
+        self.max_entries = app.config.get('QUIZ_CACHE_SIZE', self.max_entries)
+
+    def _get_or_build(self, kind, quiz_id, version, builder):
+        key = (kind, quiz_id, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = builder()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    @staticmethod
+    def current_version(quiz_id):
+        """Fetch Quiz.updated_at, returns None if the quiz does not exist"""
+        return db.session.query(Quiz.updated_at).filter(Quiz.id == quiz_id).scalar()
+
+    def get_paper(self, quiz_id, version=None):
+        """Get the student-facing quiz payload, or None if the quiz does not exist"""
+        version = version or self.current_version(quiz_id)
+        if version is None:
+            return None
+        return self._get_or_build('paper', quiz_id, version, lambda: compile_paper(quiz_id))
+
+    def get_answer_key(self, quiz_id, version=None):
+        """Get the compiled AnswerKey for a quiz"""
+        version = version or self.current_version(quiz_id)
+        return self._get_or_build('key', quiz_id, version, lambda: AnswerKey.load(quiz_id))
+
+    def invalidate(self, quiz_id):
+        """Drop every cached entry for a quiz"""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == quiz_id]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Get hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0
+            }
+
+def compile_paper(quiz_id):
+    """Build the nested question/option payload with eager loading"""
+    quiz = Quiz.query.options(
+        selectinload(Quiz.questions).selectinload(Question.options)
+    ).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        return None
+
+    questions = sorted(quiz.questions, key=lambda q: (q.order is None, q.order, q.created_at))
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'shuffle_questions': bool(quiz.shuffle_questions),
+        'shuffle_options': bool(quiz.shuffle_options),
+        'questions': [{
+            'id': q.id,
+            'type': q.question_type,
+            'text': q.question_text,
+            'points': q.points,
+            'options': [{
+                'id': o.id,
+                'text': o.option_text
+            } for o in sorted(q.options, key=lambda o: (o.order is None, o.order))] if q.question_type in OBJECTIVE_TYPES else []
+        } for q in questions]
+    }
+
+quiz_cache = QuizCache()
+
+def _touch_quiz(connection, quiz_id, session):
+    """Bump Quiz.updated_at so every worker sees a new cache version"""
+    if quiz_id is None:
+        return
+    connection.execute(
+        update(Quiz.__table__).where(Quiz.__table__.c.id == quiz_id).values(updated_at=datetime.utcnow())
+    )
+    quiz_cache.invalidate(quiz_id)
+    if session is not None:
+        bump_after_commit(('quiz', quiz_id), session=session)
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+@event.listens_for(Question, 'after_delete')
+def _question_changed(mapper, connection, target):
+    _touch_quiz(connection, target.quiz_id, object_session(target))
+
+@event.listens_for(QuestionOption, 'after_insert')
+@event.listens_for(QuestionOption, 'after_update')
+@event.listens_for(QuestionOption, 'after_delete')
+def _option_changed(mapper, connection, target):
+    quiz_id = connection.execute(
+        select(Question.__table__.c.quiz_id).where(Question.__table__.c.id == target.question_id)
+    ).scalar()
+    _touch_quiz(connection, quiz_id, object_session(target))
@@ -0,0 +1,212 @@
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Student, Section, Year
+from collections import OrderedDict
+import threading
+import time
+
+# Session.info key holding scopes to bump once the transaction commits
+PENDING_KEY = 'response_cache_bumps'
+
+# Version folded into every key; bumping it drops the whole cache
+GLOBAL_SCOPE = ('all', '')
+
+class MemoryBackend:
+    """Per-worker LRU backend; versions are only seen by the worker that bumps them"""
+
+    def __init__(self, max_entries=1024):
+        """Initialize backend"""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, keys):
+        with self._lock:
+            return [self._versions.get(key, 0) for key in keys]
+
+    def incr(self, keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+class RedisBackend:
+    """Shared backend so every worker sees the same entries and version counters"""
+
+    def __init__(self, url, prefix='gyanguru:analytics:'):
+        """Connect to Redis (requires the redis package)"""
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def versions(self, keys):
+        return [int(v or 0) for v in self.client.mget([self.prefix + k for k in keys])]
+
+    def incr(self, keys):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(self.prefix + key)
+        pipe.execute()
+
+    def size(self):
+        return None
+
+class ResponseCache:
+    """Cache of analytics JSON responses invalidated by per-scope version counters.
+
+    A cached view names the scopes its data depends on (student, section,
+    quiz, ...). The current version of each scope is part of the cache key,
+    so write paths only have to bump the versions of the scopes they touch
+    and stale entries become unreachable; entries also expire after a TTL.
+    """
+
+    def __init__(self):
+        """Initialize cache"""
+        self.backend = MemoryBackend()
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Pick the backend from config"""
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        url = app.config.get('RESPONSE_CACHE_URL')
+        if url:
+            self.backend = RedisBackend(url)
+        else:
+            self.backend = MemoryBackend(app.config.get('RESPONSE_CACHE_SIZE', 1024))
+
+    @staticmethod
+    def _version_key(scope):
+        return 'v:%s:%s' % scope
+
+    def bump(self, *scopes):
+        """Invalidate every cached response depending on the given (scope, id) pairs"""
+        self.backend.incr([self._version_key(scope) for scope in set(scopes) if scope[1] is not None])
+
+    def clear(self):
+        """Invalidate everything"""
+        self.bump(GLOBAL_SCOPE)
+
+    def cached(self, scopes):
+        """Decorator caching a view's 200 JSON response.
+
+        `scopes` receives the view's keyword arguments and returns the
+        (scope, id) pairs the response depends on. Apply below
+        @jwt_required / @require_role so access checks still run.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                depends_on = [GLOBAL_SCOPE] + list(scopes(**kwargs))
+                versions = self.backend.versions([self._version_key(scope) for scope in depends_on])
+                key = 'r:%s:%s:%s' % (
+                    fn.__name__, request.full_path,
+                    ','.join(f'{s}={i}@{v}' for (s, i), v in zip(depends_on, versions))
+                )
+
+                body = self.backend.get(key)
+                if body is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return current_app.response_class(body, status=200, mimetype='application/json')
+
+                with self._lock:
+                    self.misses += 1
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code == 200 and response.is_json:
+                    self.backend.set(key, response.get_data(), self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Get hit/miss counters for this worker"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'entries': self.backend.size(),
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0
+            }
+
+response_cache = ResponseCache()
+
+def student_scopes(student_id):
+    """Every scope a student's results roll up into: the student, their user, section, year, department and institution"""
+    row = db.session.query(
+        Student.user_id, Student.section_id, Student.institution_id, Section.year_id, Year.department_id
+    ).outerjoin(
+        Section, Section.id == Student.section_id
+    ).outerjoin(
+        Year, Year.id == Section.year_id
+    ).filter(Student.id == student_id).first()
+    if not row:
+        return [('student', student_id)]
+
+    user_id, section_id, institution_id, year_id, department_id = row
+    return [
+        ('student', student_id),
+        ('user', user_id),
+        ('section', section_id),
+        ('year', year_id),
+        ('department', department_id),
+        ('institution', institution_id)
+    ]
+
+def bump_after_commit(*scopes, session=None):
+    """Queue version bumps that run only once the current transaction commits.
+
+    Bumping before commit would let a concurrent read cache pre-commit
+    data under the new version.
+    """
+    (session or db.session).info.setdefault(PENDING_KEY, set()).update(scopes)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    scopes = session.info.pop(PENDING_KEY, None)
+    if not scopes:
+        return
+    try:
+        response_cache.bump(*scopes)
+    except Exception as e:
+        current_app.logger.error(f'Response cache invalidation failed: {str(e)}')
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop(PENDING_KEY, None)
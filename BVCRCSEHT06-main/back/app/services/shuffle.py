@@ -0,0 +1,26 @@
+import hashlib
+import random
+
+def attempt_seed(quiz_id, student_id, attempt_number):
+    """Derive a stable PRNG seed for one student's attempt at a quiz"""
+    raw = f'{quiz_id}:{student_id}:{attempt_number}'.encode('utf-8')
+    return int.from_bytes(hashlib.sha256(raw).digest()[:8], 'big')
+
+def shuffle_paper(paper, seed):
+    """Return a copy of a compiled quiz paper in the attempt's order.
+
+    The order is recomputed from the seed on every call, so nothing is
+    stored per attempt and the shared cached paper is never mutated.
+    """
+    rng = random.Random(seed)
+
+    questions = [dict(q) for q in paper['questions']]
+    if paper.get('shuffle_options'):
+        for question in questions:
+            options = list(question['options'])
+            rng.shuffle(options)
+            question['options'] = options
+    if paper.get('shuffle_questions'):
+        rng.shuffle(questions)
+
+    return {**paper, 'questions': questions}
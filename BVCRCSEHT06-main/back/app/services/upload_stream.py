@@ -0,0 +1,184 @@
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from app.services.blob_store import blob_store
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+# Bytes buffered before the content is checked against its extension
+SNIFF_BYTES = 2048
+
+# Largest non-file form field kept in memory (e.g. submission text)
+MAX_FIELD_BYTES = 1024 * 1024
+
+TEXT_EXTENSIONS = {'txt', 'py', 'csv'}
+
+def _is_mp3(head):
+    return head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+# extension -> predicate over the first bytes of the file
+SIGNATURES = {
+    'pdf': lambda head: b'%PDF-' in head[:1024],
+    'docx': lambda head: head.startswith(b'PK\x03\x04'),
+    'png': lambda head: head.startswith(b'\x89PNG\r\n\x1a\n'),
+    'jpg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'jpeg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'gif': lambda head: head[:6] in (b'GIF87a', b'GIF89a'),
+    'wav': lambda head: head[:4] == b'RIFF' and head[8:12] == b'WAVE',
+    'mp3': _is_mp3,
+    'm4a': lambda head: head[4:8] == b'ftyp'
+}
+
+class UploadRejected(ValueError):
+    """An upload failed validation; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def too_large(max_bytes):
+    """413 rejection naming the limit"""
+    if max_bytes >= 1024 * 1024:
+        limit = f'{max_bytes / (1024 * 1024):g} MB'
+    else:
+        limit = f'{max_bytes / 1024:g} KB'
+    return UploadRejected(f'File too large (limit {limit})', 413)
+
+def extension_of(filename):
+    """Lower-case extension without the dot"""
+    return os.path.splitext(secure_filename(filename or ''))[1].lower().lstrip('.')
+
+def sniff(head, extension):
+    """True when the leading bytes look like the claimed file type"""
+    if extension in TEXT_EXTENSIONS:
+        return b'\x00' not in head
+    check = SIGNATURES.get(extension)
+    return bool(check and check(head))
+
+class _FileSink:
+    """Writes one file part to a temporary file in the blob store while hashing it"""
+
+    def __init__(self, extension, max_bytes, type_error):
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.type_error = type_error
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.sniffed = False
+        fd, self.temp_path = tempfile.mkstemp(dir=blob_store.root, suffix='.part')
+        self.out = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise too_large(self.max_bytes)
+
+        if not self.sniffed:
+            self.head += data
+            if len(self.head) < SNIFF_BYTES:
+                return
+            self._check()
+            data, self.head = self.head, b''
+
+        self.digest.update(data)
+        self.out.write(data)
+
+    def _check(self):
+        self.sniffed = True
+        if not sniff(self.head[:SNIFF_BYTES], self.extension):
+            raise UploadRejected(self.type_error, 415)
+
+    def finish(self):
+        """Flush the buffered head (small files) and close"""
+        if not self.sniffed:
+            self._check()
+            self.digest.update(self.head)
+            self.out.write(self.head)
+            self.head = b''
+        self.out.close()
+
+    def discard(self):
+        self.out.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def receive(request, extensions, max_bytes, type_error='File type not allowed', field='file', reference=True):
+    """Stream a multipart upload into the blob store without spooling it.
+
+    The body is read in CHUNK_SIZE pieces: the `field` file part is
+    hashed and written to a temporary file as it arrives, its extension
+    is checked as soon as its headers are parsed and its magic bytes
+    after the first SNIFF_BYTES, and reading stops with UploadRejected
+    (413/415) the moment a limit is crossed. Returns (blob, fields): the
+    StoredFile (None if no file was sent), referenced unless
+    reference=False, and the other form fields. The file is moved into
+    place when the caller commits. Must be called before anything touches
+    request.form or request.files.
+    """
+    if request.mimetype != 'multipart/form-data' or 'boundary' not in request.mimetype_params:
+        raise UploadRejected('Expected multipart/form-data')
+    if request.content_length is not None and request.content_length > max_bytes + MAX_FIELD_BYTES:
+        raise too_large(max_bytes)
+
+    decoder = MultipartDecoder(request.mimetype_params['boundary'].encode(), max_form_memory_size=MAX_FIELD_BYTES)
+    fields = {}
+    sink = None
+    finished = None
+    part = None
+    buffer = []
+    stream = request.stream
+
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File) and event.name == field and event.filename and finished is None:
+                    extension = extension_of(event.filename)
+                    if extension not in extensions:
+                        raise UploadRejected(type_error, 415)
+                    part = sink = _FileSink(extension, max_bytes, type_error)
+                elif isinstance(event, (Field, File)):
+                    part = event
+                    buffer = []
+                elif isinstance(event, Data):
+                    if part is sink and sink is not None:
+                        sink.write(event.data)
+                        if not event.more_data:
+                            sink.finish()
+                            finished, sink = sink, None
+                    elif isinstance(part, Field):
+                        buffer.append(event.data)
+                        if sum(map(len, buffer)) > MAX_FIELD_BYTES:
+                            raise UploadRejected(f'Form field {part.name} too large', 413)
+                        if not event.more_data:
+                            fields[part.name] = b''.join(buffer).decode('utf-8', 'replace')
+                event = decoder.next_event()
+
+            if isinstance(event, Epilogue) or not chunk:
+                break
+    except BaseException as e:
+        if sink:
+            sink.discard()
+        if isinstance(e, RequestEntityTooLarge):
+            raise UploadRejected('Upload too large', 413)
+        if isinstance(e, ValueError) and not isinstance(e, UploadRejected):
+            raise UploadRejected('Malformed upload')
+        raise
+
+    if sink:
+        # Body ended inside the file part
+        sink.discard()
+        raise UploadRejected('Incomplete upload')
+    if not finished:
+        return None, fields
+
+    blob = blob_store.commit_temp(
+        finished.temp_path, finished.digest.hexdigest(), finished.size, '.' + finished.extension, reference
+    )
+    return blob, fields
@@ -1,7 +1,8 @@
 from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity
-from app.models import User
+from app.models import User, Teacher
+from app.services.access import SCOPES, teacher_in_scope
 
 def require_role(allowed_roles):
     """Decorator to check user role"""
@@ -18,6 +19,25 @@ def require_role(allowed_roles):
         return wrapper
     return decorator
 
+def require_scope_access(fn):
+    """Decorator limiting teachers to their own institution, department, year or section.
+
+    Reads the view's scope and scope_id arguments; admins may read every
+    scope. Apply above any response cache so cached responses are checked too.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = User.query.get(get_jwt_identity())
+        scope = kwargs.get('scope')
+        
+        if user and user.role.value != 'admin' and scope in SCOPES:
+            teacher = Teacher.query.filter_by(user_id=user.id).first()
+            if not teacher or not teacher_in_scope(teacher, scope, kwargs.get('scope_id')):
+                return jsonify({'error': f'Access denied. Not your {scope}'}), 403
+        
+        return fn(*args, **kwargs)
+    return wrapper
+
 def handle_errors(fn):
     """Decorator for error handling"""
     @wraps(fn)
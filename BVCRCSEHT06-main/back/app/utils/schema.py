@@ -0,0 +1,110 @@
+from app import db
+from sqlalchemy import inspect, text, Float
+
+def _missing_columns(inspector, table):
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    return [column for column in table.columns if column.name not in existing]
+
+def _add_column_sql(column, dialect):
+    """ALTER TABLE ... ADD COLUMN for a column missing from an existing table"""
+    sql = f'ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        # Existing rows take the model default; NOT NULL is only safe with one
+        sql += f' DEFAULT {int(default) if isinstance(default, bool) else repr(default)}'
+        if not column.nullable:
+            sql += ' NOT NULL'
+    return sql
+
+def _wanted_indexes(table):
+    """(name, column names, unique) of model indexes and unique constraints.
+
+    Unique constraints become unique indexes, since SQLite cannot add a
+    constraint to an existing table; ON CONFLICT accepts either.
+    """
+    wanted = [(index.name, [column.name for column in index.columns], index.unique) for index in table.indexes]
+    for constraint in table.constraints:
+        if isinstance(constraint, db.UniqueConstraint) and constraint.name:
+            wanted.append((constraint.name, [column.name for column in constraint.columns], True))
+    return wanted
+
+def _keep_newest(table, columns, order_column):
+    """DELETE all but the newest row (by order_column, NULLs oldest) of each group of rows sharing non-NULL columns"""
+    partition = ', '.join(columns)
+    not_null = ' AND '.join(f'{column} IS NOT NULL' for column in columns)
+    order = f'CASE WHEN {order_column} IS NULL THEN 1 ELSE 0 END, {order_column} DESC, id DESC'
+    return (
+        f'DELETE FROM {table} WHERE id IN (SELECT id FROM ('
+        f'SELECT id, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY {order}) AS n '
+        f'FROM {table} WHERE {not_null}) ranked WHERE n > 1)'
+    )
+
+# Rows that would violate a unique index the upgrade creates, fixed before it is created:
+# attempts sharing a number are renumbered 1, 2, ... in start order, and duplicate
+# answers and performance rows are collapsed to the newest one
+DEDUPLICATE = {
+    'unique_quiz_student_attempt': (
+        'UPDATE quiz_attempts SET attempt_number = ('
+        'SELECT ranked.n FROM ('
+        'SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY quiz_id, student_id '
+        'ORDER BY CASE WHEN started_at IS NULL THEN 1 ELSE 0 END, started_at, id) AS n '
+        'FROM quiz_attempts) ranked WHERE ranked.id = quiz_attempts.id'
+        ') WHERE (quiz_id, student_id) IN ('
+        'SELECT quiz_id, student_id FROM quiz_attempts GROUP BY quiz_id, student_id '
+        'HAVING COUNT(attempt_number) > COUNT(DISTINCT attempt_number))'
+    ),
+    'unique_attempt_question': _keep_newest('student_answers', ('attempt_id', 'question_id'), 'answered_at'),
+    'unique_student_subject_performance': _keep_newest('performances', ('student_id', 'subject'), 'last_updated')
+}
+
+def upgrade_schema():
+    """Bring an existing database up to the models without dropping data.
+
+    db.create_all() creates missing tables but never alters existing
+    ones, so databases created before a model gained columns, indexes or
+    unique constraints are upgraded here: missing columns are added (with
+    their model default), missing indexes and unique constraints are
+    created as indexes, and on PostgreSQL integer columns that are now
+    Float (scores, points) are widened. SQLite needs no type change, an
+    INTEGER column stores fractional scores as REAL. Rows that would
+    break a new unique index are fixed first (see DEDUPLICATE), so the
+    upgrade never stops halfway on old duplicates. Safe to re-run;
+    returns the statements it executed.
+    """
+    db.create_all()
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+    tables = set(inspector.get_table_names())
+    statements = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+
+        for column in _missing_columns(inspector, table):
+            statements.append(_add_column_sql(column, dialect))
+
+        if dialect.name == 'postgresql':
+            types = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if isinstance(column.type, Float) and column.name in types and \
+                        types[column.name].python_type is int:
+                    statements.append(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE DOUBLE PRECISION'
+                    )
+
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        existing.update(constraint['name'] for constraint in inspector.get_unique_constraints(table.name))
+        for name, columns, unique in _wanted_indexes(table):
+            if name not in existing:
+                if name in DEDUPLICATE:
+                    statements.append(DEDUPLICATE[name])
+                statements.append(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table.name} ({', '.join(columns)})"
+                )
+
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    return statements
@@ -0,0 +1,27 @@
+from app import db
+from sqlalchemy.dialects import postgresql, sqlite
+
+def dialect_insert(table):
+    """Get an INSERT supporting on_conflict_do_update for the bound database"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f'Upsert not supported on {dialect}')
+
+def upsert(table, rows, index_elements, overwrite=(), increment=()):
+    """Insert rows or update the conflicting ones in one executemany.
+
+    Columns in `overwrite` take the new value, columns in `increment` are
+    added to the stored value so concurrent writers never lose updates.
+    """
+    if not rows:
+        return
+
+    stmt = dialect_insert(table)
+    set_ = {column: stmt.excluded[column] for column in overwrite}
+    set_.update({column: table.c[column] + stmt.excluded[column] for column in increment})
+
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+    db.session.execute(stmt, rows)
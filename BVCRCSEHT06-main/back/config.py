@@ -25,6 +25,15 @@ class Config:
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 104857600))  # 100MB
     ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'pdf,docx,txt,mp3,wav,jpg,jpeg,png,py,csv').split(','))
+    # Per-endpoint limits in bytes; uploads are streamed and cut off with 413 once over them
+    UPLOAD_LIMITS = {
+        'essay': int(os.getenv('UPLOAD_LIMIT_ESSAY', 10 * 1024 * 1024)),
+        'code': int(os.getenv('UPLOAD_LIMIT_CODE', 1024 * 1024)),
+        'audio': int(os.getenv('UPLOAD_LIMIT_AUDIO', 50 * 1024 * 1024)),
+        'image': int(os.getenv('UPLOAD_LIMIT_IMAGE', 15 * 1024 * 1024)),
+        'pdf': int(os.getenv('UPLOAD_LIMIT_PDF', 100 * 1024 * 1024)),
+        'submission': int(os.getenv('UPLOAD_LIMIT_SUBMISSION', 25 * 1024 * 1024))
+    }
     
     # Google Gemini
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -36,6 +45,73 @@ class Config:
     # CORS
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:5173', 'http://127.0.0.1:3000']
     
+    # In-process caches
+    QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 256))  # compiled quiz papers/answer keys per worker
+    COHORT_CACHE_TTL = int(os.getenv('COHORT_CACHE_TTL', 300))  # seconds a score distribution is reused
+    COHORT_CACHE_SIZE = int(os.getenv('COHORT_CACHE_SIZE', 512))
+    # Analytics response cache; set a redis:// URL to share it between workers
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))  # entries per worker (in-memory backend)
+    
+    # Exam-start admission control (token bucket, per worker)
+    EXAM_START_RATE = float(os.getenv('EXAM_START_RATE', 20))  # admissions per second
+    EXAM_START_BURST = int(os.getenv('EXAM_START_BURST', 40))
+    EXAM_START_MAX_WAIT = float(os.getenv('EXAM_START_MAX_WAIT', 10))  # seconds queued before 429
+    
+    # Persistent AI analysis cache (ai_results table)
+    AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'true').lower() == 'true'
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 30 * 86400))  # seconds
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 50000))
+    
+    # Background upload analysis (analysis_jobs table polled by every worker)
+    ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', 4))  # concurrent jobs per worker
+    ANALYSIS_JOB_POLL_SECONDS = int(os.getenv('ANALYSIS_JOB_POLL_SECONDS', 2))
+    ANALYSIS_JOB_TIMEOUT = int(os.getenv('ANALYSIS_JOB_TIMEOUT', 600))  # seconds running before a job is retried
+    ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', 3))
+    ANALYSIS_JOB_MAX_WAIT = int(os.getenv('ANALYSIS_JOB_MAX_WAIT', 30))  # longest ?wait= on the status endpoint
+    ANALYSIS_JOB_RETENTION = int(os.getenv('ANALYSIS_JOB_RETENTION', 7 * 86400))  # seconds finished jobs are kept
+    
+    # Background AI grading
+    AI_GRADING_CONCURRENCY = int(os.getenv('AI_GRADING_CONCURRENCY', 4))  # concurrent Gemini calls per worker
+    AI_GRADING_MAX_TRIES = int(os.getenv('AI_GRADING_MAX_TRIES', 3))  # per answer, before leaving it to regrade-pending
+    AI_GRADING_RETRY_SECONDS = int(os.getenv('AI_GRADING_RETRY_SECONDS', 30))  # first retry delay, doubled each time
+    AI_GRADING_SWEEP_SECONDS = int(os.getenv('AI_GRADING_SWEEP_SECONDS', 300))  # re-enqueue attempts pending this long; 0 disables
+    
+    # Leaderboards: lookback when syncing the in-memory index from the database
+    LEADERBOARD_SYNC_LAG_SECONDS = int(os.getenv('LEADERBOARD_SYNC_LAG_SECONDS', 5))
+    LEADERBOARD_FULL_SYNC_SECONDS = int(os.getenv('LEADERBOARD_FULL_SYNC_SECONDS', 300))  # full reload of a section
+    
+    # Concept mastery: answers needed before a concept is judged, and the error-rate cut-offs
+    CONCEPT_MIN_ATTEMPTS = int(os.getenv('CONCEPT_MIN_ATTEMPTS', 3))
+    CONCEPT_WEAK_ERROR_RATE = float(os.getenv('CONCEPT_WEAK_ERROR_RATE', 0.5))
+    CONCEPT_STRONG_ERROR_RATE = float(os.getenv('CONCEPT_STRONG_ERROR_RATE', 0.2))
+    
+    # Parent progress trends: default and maximum window sizes
+    PROGRESS_TREND_LIMIT = int(os.getenv('PROGRESS_TREND_LIMIT', 5))  # recent attempts/submissions
+    PROGRESS_TREND_MAX_LIMIT = int(os.getenv('PROGRESS_TREND_MAX_LIMIT', 50))
+    PROGRESS_TREND_MAX_DAYS = int(os.getenv('PROGRESS_TREND_MAX_DAYS', 180))  # daily buckets
+    
+    # Bulk exports: rows fetched per round trip and written per chunk
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    
+    # PDF text extraction and OCR share a pool of PDF_EXTRACT_PROCESSES processes; documents of at
+    # least PDF_PARALLEL_MIN_PAGES pages are split into PDF_PAGES_PER_TASK-page ranges
+    PDF_EXTRACT_PROCESSES = int(os.getenv('PDF_EXTRACT_PROCESSES', min(4, os.cpu_count() or 1)))
+    PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 25))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 100))
+    PDF_READ_MAX_PAGES = int(os.getenv('PDF_READ_MAX_PAGES', 50))  # pages per /upload/pdf/read response
+    PDF_INDEX_CACHE_SIZE = int(os.getenv('PDF_INDEX_CACHE_SIZE', 64))  # page indexes kept parsed per worker
+    
+    # OCR: images are grayscaled, downscaled to OCR_TARGET_DPI (longest side at most OCR_MAX_SIDE)
+    # and deskewed; PDF pages with under OCR_MIN_PAGE_CHARS characters of text are treated as scans
+    OCR_LANG = os.getenv('OCR_LANG', 'eng')
+    OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', 300))
+    OCR_MAX_SIDE = int(os.getenv('OCR_MAX_SIDE', 4000))
+    OCR_TILE_MIN_HEIGHT = int(os.getenv('OCR_TILE_MIN_HEIGHT', 3000))  # taller images are OCR'd in parallel bands
+    OCR_MIN_PAGE_CHARS = int(os.getenv('OCR_MIN_PAGE_CHARS', 20))
+    OCR_SCANNED_PDFS = os.getenv('OCR_SCANNED_PDFS', 'true').lower() == 'true'
+    
     # File expiration (in seconds)
     TEMP_FILE_EXPIRATION = 86400  # 24 hours
     DOUBT_ROOM_EXPIRATION = 7200  # 2 hours
@@ -0,0 +1,94 @@
+import pytest
+from app import create_app, db
+from app.models import (
+    User, UserRole, Institution, Department, Year, Section, Student, Teacher,
+    Quiz, Question, QuestionOption, QuizAttempt
+)
+
+@pytest.fixture(scope='session')
+def app():
+    """Application built with TestingConfig (in-memory SQLite)"""
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def session(app):
+    """Fresh tables for every test"""
+    db.create_all()
+    yield db.session
+    db.session.remove()
+    db.drop_all()
+
+def make_user(username, role):
+    user = User(
+        email=f'{username}@example.com', username=username, password_hash='x',
+        first_name=username, last_name='Test', role=role
+    )
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+@pytest.fixture
+def quiz(session):
+    """A published quiz with an mcq (2 points), a multiple_select (4 points) and a descriptive (5 points) question.
+
+    Returns (quiz, student, questions by type, option ids by label);
+    options a and c, d are correct.
+    """
+    institution = Institution(name='Institution')
+    session.add(institution)
+    session.flush()
+    department = Department(institution_id=institution.id, name='Computer Science', code='CSE')
+    session.add(department)
+    session.flush()
+    year = Year(department_id=department.id, year_number=1)
+    session.add(year)
+    session.flush()
+    section = Section(year_id=year.id, name='A')
+    session.add(section)
+    session.flush()
+
+    teacher = Teacher(user_id=make_user('teacher', UserRole.TEACHER).id, department_id=department.id)
+    student = Student(
+        user_id=make_user('student', UserRole.STUDENT).id, institution_id=institution.id,
+        section_id=section.id, roll_number='1'
+    )
+    session.add_all([teacher, student])
+    session.flush()
+
+    quiz = Quiz(teacher_id=teacher.id, section_id=section.id, title='Quiz', subject='cs', is_published=True)
+    session.add(quiz)
+    session.flush()
+
+    questions = {}
+    for order, (question_type, points) in enumerate((('mcq', 2), ('multiple_select', 4), ('descriptive', 5))):
+        questions[question_type] = Question(
+            quiz_id=quiz.id, question_type=question_type, question_text=f'{question_type}?',
+            points=points, order=order
+        )
+    session.add_all(questions.values())
+    session.flush()
+
+    options = {}
+    for question_type, specs in (('mcq', (('a', True), ('b', False))),
+                                 ('multiple_select', (('c', True), ('d', True), ('e', False)))):
+        for order, (label, is_correct) in enumerate(specs):
+            option = QuestionOption(
+                question_id=questions[question_type].id, option_text=label, is_correct=is_correct, order=order
+            )
+            session.add(option)
+            session.flush()
+            options[label] = option.id
+
+    session.commit()
+    return quiz, student, questions, options
+
+@pytest.fixture
+def attempt(session, quiz):
+    """An in-progress attempt of the quiz fixture"""
+    quiz, student, _, _ = quiz
+    attempt = QuizAttempt(quiz_id=quiz.id, student_id=student.id, attempt_number=1, status='in_progress')
+    session.add(attempt)
+    session.commit()
+    return attempt
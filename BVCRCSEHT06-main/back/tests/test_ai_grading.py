@@ -0,0 +1,70 @@
+import pytest
+from app import db
+from app.models import ConceptMastery, QuizAttempt, StudentAnswer
+from app.services import ai_grading
+from app.services.ai_grading import ai_grading_queue
+from app.services.grading import AnswerKey, GradingEngine
+
+@pytest.fixture
+def pending_answer(quiz, attempt):
+    """Id of the attempt's descriptive answer, submitted and waiting for AI grading"""
+    quiz, _, questions, _ = quiz
+    questions['descriptive'].concepts = ['recursion']
+    db.session.commit()
+
+    GradingEngine(AnswerKey.load(quiz.id)).grade(attempt, [
+        {'question_id': questions['descriptive'].id, 'text': 'An answer'}
+    ])
+    db.session.commit()
+    return StudentAnswer.query.filter_by(attempt_id=attempt.id).one().id
+
+def fake_ai(monkeypatch, score, during_call=None):
+    class FakeAIAnalysisService:
+        def grade_answer(self, *args):
+            if during_call:
+                during_call()
+            return {'score': score, 'feedback': 'ok'}
+
+    monkeypatch.setattr(ai_grading, 'AIAnalysisService', FakeAIAnalysisService)
+
+def concept_attempts(attempt):
+    return [row.attempts for row in ConceptMastery.query.filter_by(student_id=attempt.student_id)]
+
+def test_graded_answer_completes_the_attempt(monkeypatch, attempt, pending_answer):
+    fake_ai(monkeypatch, 4)
+
+    assert ai_grading_queue.grade_answer(pending_answer) == attempt.id
+    assert ai_grading_queue.finalize_attempt(attempt.id) is True
+
+    db.session.expire_all()
+    answer = db.session.get(StudentAnswer, pending_answer)
+    assert (answer.points_earned, answer.is_correct) == (4, True)
+    assert db.session.get(QuizAttempt, attempt.id).status == 'completed'
+    assert concept_attempts(attempt) == [1]
+
+def test_answer_graded_concurrently_is_counted_once(monkeypatch, attempt, pending_answer):
+    def other_worker_grades_it():
+        db.session.execute(
+            StudentAnswer.__table__.update().where(StudentAnswer.id == pending_answer).values(
+                points_earned=1, is_correct=False
+            )
+        )
+        db.session.commit()
+
+    fake_ai(monkeypatch, 4, during_call=other_worker_grades_it)
+
+    assert ai_grading_queue.grade_answer(pending_answer) is None
+
+    db.session.expire_all()
+    answer = db.session.get(StudentAnswer, pending_answer)
+    assert (answer.points_earned, answer.is_correct) == (1, False)
+    assert concept_attempts(attempt) == []
+
+def test_reply_without_score_leaves_the_answer_pending(monkeypatch, pending_answer):
+    fake_ai(monkeypatch, None)
+
+    with pytest.raises(ai_grading.GradingError):
+        ai_grading_queue.grade_answer(pending_answer)
+
+    db.session.rollback()
+    assert db.session.get(StudentAnswer, pending_answer).is_correct is None
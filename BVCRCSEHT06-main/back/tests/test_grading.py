@@ -0,0 +1,113 @@
+import pytest
+from app import db
+from app.models import QuizAttempt, StudentAnswer
+from app.services.ai_grading import ai_grading_queue
+from app.services.grading import AnswerKey, GradingEngine
+
+@pytest.fixture
+def engine(quiz):
+    return GradingEngine(AnswerKey.load(quiz[0].id))
+
+def ids(quiz, *labels):
+    return {quiz[3][label] for label in labels}
+
+def question_id(quiz, question_type):
+    return quiz[2][question_type].id
+
+def test_answer_key_loads_points_and_correct_options(quiz, engine):
+    key = engine.answer_key
+    assert key.total_points == 11
+    assert key.questions[question_id(quiz, 'mcq')]['correct'] == ids(quiz, 'a')
+    assert key.questions[question_id(quiz, 'multiple_select')]['correct'] == ids(quiz, 'c', 'd')
+    assert key.questions[question_id(quiz, 'descriptive')]['options'] == frozenset()
+
+@pytest.mark.parametrize('labels, expected', [
+    (('a',), (2, True)),
+    (('b',), (0, False)),
+    (('a', 'b'), (0, False)),
+    ((), (0, False))
+])
+def test_mcq_is_all_or_nothing(quiz, engine, labels, expected):
+    assert engine.score(question_id(quiz, 'mcq'), ids(quiz, *labels)) == expected
+
+@pytest.mark.parametrize('labels, expected', [
+    (('c', 'd'), (4, True)),
+    (('c',), (2, False)),
+    (('c', 'e'), (0, False)),
+    (('c', 'd', 'e'), (2, False)),
+    (('e',), (0, False)),
+    ((), (0, False))
+])
+def test_multiple_select_partial_credit_with_wrong_picks(quiz, engine, labels, expected):
+    assert engine.score(question_id(quiz, 'multiple_select'), ids(quiz, *labels)) == expected
+
+def test_subjective_answers_are_left_ungraded(quiz, engine):
+    assert engine.score(question_id(quiz, 'descriptive'), set()) == (0, None)
+
+def test_selected_options_merges_single_and_multiple():
+    assert GradingEngine.selected_options({'option_id': 'x', 'option_ids': ['y']}) == {'x', 'y'}
+    assert GradingEngine.selected_options({}) == set()
+
+def test_objective_only_attempt_completes(quiz, engine, attempt):
+    rows = engine.grade(attempt, [
+        {'question_id': question_id(quiz, 'mcq'), 'option_id': quiz[3]['a']},
+        {'question_id': question_id(quiz, 'multiple_select'), 'option_ids': [quiz[3]['c'], quiz[3]['e']]},
+        {'question_id': 'not-in-this-quiz', 'option_id': quiz[3]['a']}
+    ])
+    db.session.commit()
+
+    assert len(rows) == 2
+    assert attempt.status == 'completed'
+    assert attempt.score == 2
+    assert attempt.total_points == 11
+    assert attempt.percentage == pytest.approx(2 / 11 * 100)
+
+def test_foreign_option_ids_are_ignored(quiz, engine, attempt):
+    rows = engine.grade(attempt, [
+        {'question_id': question_id(quiz, 'mcq'), 'option_ids': [quiz[3]['a'], quiz[3]['c']]}
+    ])
+
+    assert rows[0]['selected_option_ids'] == [quiz[3]['a']]
+    assert rows[0]['is_correct'] is True
+
+def test_pending_subjective_answer_waits_for_ai_grading(quiz, engine, attempt):
+    descriptive_id = question_id(quiz, 'descriptive')
+    engine.grade(attempt, [
+        {'question_id': question_id(quiz, 'mcq'), 'option_id': quiz[3]['a']},
+        {'question_id': question_id(quiz, 'multiple_select'), 'option_ids': [quiz[3]['c'], quiz[3]['d']]},
+        {'question_id': descriptive_id, 'text': 'An answer'}
+    ])
+    db.session.commit()
+
+    assert attempt.status == 'submitted'
+    assert attempt.score == 6
+
+    # Nothing changes while the subjective answer is ungraded
+    assert ai_grading_queue.finalize_attempt(attempt.id) is False
+    assert db.session.get(QuizAttempt, attempt.id).status == 'submitted'
+
+    answer = StudentAnswer.query.filter_by(attempt_id=attempt.id, question_id=descriptive_id).one()
+    answer.points_earned = 3
+    answer.is_correct = True
+    db.session.commit()
+
+    assert ai_grading_queue.finalize_attempt(attempt.id) is True
+    db.session.expire_all()
+    attempt = db.session.get(QuizAttempt, attempt.id)
+    assert attempt.status == 'completed'
+    assert attempt.score == 9
+    assert attempt.percentage == pytest.approx(9 / 11 * 100)
+
+    # A second finalize does not complete (and count) the attempt again
+    assert ai_grading_queue.finalize_attempt(attempt.id) is False
+
+def test_regrading_overwrites_stored_answers(quiz, engine, attempt):
+    mcq_id = question_id(quiz, 'mcq')
+    engine.grade(attempt, [{'question_id': mcq_id, 'option_id': quiz[3]['b']}])
+    engine.grade(attempt, [{'question_id': mcq_id, 'option_id': quiz[3]['a']}])
+    db.session.commit()
+
+    answers = StudentAnswer.query.filter_by(attempt_id=attempt.id).all()
+    assert len(answers) == 1
+    assert answers[0].is_correct is True
+    assert answers[0].points_earned == 2